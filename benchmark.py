@@ -0,0 +1,214 @@
+#!/usr/bin/python
+
+from src.tree import TaskTree, ColumnarTaskTree, TaskTreeSortKey
+from src.task import Task
+from src.config import Config
+from src.treeparser import TaskTreeParserAuto
+from datetime import date, timedelta
+import tempfile
+import tracemalloc
+import os.path
+import time
+import argparse
+
+"""
+This script measures run time and memory usage of tree operations
+on synthetic task trees.
+Run ./benchmark.py -h for the list of available benchmarks.
+"""
+
+def empty_tree(directory, tree_class=TaskTree):
+    # the file is not existing, so the tree starts with a single empty task
+    return tree_class(os.path.join(directory, "benchmark.xml"), None, TaskTreeParserAuto)
+
+def timed(name, func):
+    start = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start
+    print("{}: {:.3f}s".format(name, duration))
+    return duration
+
+# builds a tree of `count` tasks below `parent` where every task has
+# up to `fanout` children. every few tasks have a date, a priority,
+# text or categories set
+def synthetic_tasks(parent, count, fanout=10):
+    tasks = []
+    for i in range(count):
+        task = Task("task {}".format(i), parent if i == 0 else tasks[(i - 1) // fanout])
+        if i % 3 == 0:
+            task.due = date.today() + timedelta(days=i % 60)
+        if i % 5 == 0:
+            task.scheduled = date.today() + timedelta(days=i % 30)
+        if i % 4 == 0:
+            task.priority = i % 10
+        if i % 7 == 0:
+            task.text = "some text"
+        if i % 2 == 0:
+            task.add_category("cat{}".format(i % 8))
+        tasks.append(task)
+
+    return tasks
+
+def bench_append(args):
+    with tempfile.TemporaryDirectory() as directory:
+        tree = empty_tree(directory)
+        inbox = tree.root.first_link_child
+
+        def append():
+            for i in range(args.count):
+                inbox.insert_as_last_child(Task(str(i)))
+
+        duration = timed("append {} children to one parent".format(args.count), append)
+        print("{:.2f}us per child".format(duration / args.count * 1e6))
+
+def bench_memory(args):
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.counts:
+            tree = empty_tree(directory)
+            inbox = tree.root.first_link_child
+
+            tracemalloc.start()
+            tasks = synthetic_tasks(inbox, count)
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print("{} tasks: {:.1f} MiB, {:.0f} bytes per task".format(count, size / 2**20, size / count))
+
+            del tasks, tree, inbox
+
+def bench_load(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark." + args.format)
+        tree = empty_tree(directory)
+        synthetic_tasks(tree.root.first_link_child, args.count)
+        tree.path = path
+        tree.save()
+
+        timed("load {} tasks from {}".format(args.count, args.format),
+                lambda: TaskTree(path, None, TaskTreeParserAuto))
+
+# progress of every task, as shown next to every row
+def bench_progress(args):
+    with tempfile.TemporaryDirectory() as directory:
+        tree = empty_tree(directory)
+        tasks = synthetic_tasks(tree.root.first_link_child, args.count)
+
+        timed("progress of {} tasks".format(args.count), lambda: [t.progress for t in tasks])
+
+# adds new tasks below the cursor like typing 'o' does
+def bench_newtask(args):
+    with tempfile.TemporaryDirectory() as directory:
+        tree = empty_tree(directory)
+        tasks = synthetic_tasks(tree.root.first_link_child, args.count)
+        tree.viewport_height = 50
+        tree.cursor = tasks[args.count // 2]
+        tree.view.display_list
+
+        def newtasks():
+            for i in range(args.repeat):
+                tree.new_task_sibling_after()
+                tree.view.display_list
+
+        duration = timed("{} new tasks in a tree of {} tasks".format(args.repeat, args.count), newtasks)
+        print("{:.2f}ms per task".format(duration / args.repeat * 1e3))
+
+# computes the rows of the task pane and the schedule after a change of
+# the sort key. the rows are counted and the first screen is read, or the
+# tree list of the flat tree is regenerated if --flat is given
+def bench_treelist(args):
+    tree_class = ColumnarTaskTree if args.columnar else TaskTree
+    Config.set("behaviour.flat_tree", args.flat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        tree = empty_tree(directory, tree_class)
+        tasks = synthetic_tasks(tree.root.first_link_child, args.count)
+        # tasks[0] holds all other tasks, collapse one of its children
+        # to hide about a tenth of the tree
+        tasks[2].collapsed = True
+
+        def regen():
+            for key in (TaskTreeSortKey.NATURAL, TaskTreeSortKey.TITLE, TaskTreeSortKey.DATE):
+                tree.sort_key = key
+                rows = tree.tree_rows
+                len(rows)
+                rows[:50]
+                len(tree.schedule_list)
+
+        timed("{}{}: rows and schedule of {} tasks, 3 sort keys".format(
+                tree_class.__name__, " (flat)" if args.flat else "", args.count), regen)
+
+# draws the task pane for the first time and scrolls through it
+def bench_paint(args):
+    with tempfile.TemporaryDirectory() as directory:
+        tree = empty_tree(directory)
+        synthetic_tasks(tree.root.first_link_child, args.count)
+        tree.viewport_height = 50
+
+        timed("first paint of {} tasks".format(args.count), lambda: tree.view.display_list)
+
+        def scroll():
+            for i in range(args.repeat):
+                tree.view.move_flat(1)
+                tree.view.display_list
+
+        duration = timed("scrolling {} rows".format(args.repeat), scroll)
+        print("{:.2f}ms per row".format(duration / args.repeat * 1e3))
+
+# switches between sort orders, as done by the sort_* commands
+def bench_sort(args):
+    with tempfile.TemporaryDirectory() as directory:
+        tree = empty_tree(directory)
+        synthetic_tasks(tree.root.first_link_child, args.count)
+
+        def switch():
+            for i in range(args.repeat):
+                for key in (TaskTreeSortKey.TITLE, TaskTreeSortKey.DUE, TaskTreeSortKey.DATE):
+                    tree.sort_key = key
+                    tree.tree_rows[:50]
+
+        timed("{} times sort_title, sort_due and sort_date on {} tasks".format(args.repeat, args.count), switch)
+
+parser = argparse.ArgumentParser(description='Benchmark treetasks on synthetic task trees')
+subparsers = parser.add_subparsers(help='benchmarks', required=True)
+
+parser_append = subparsers.add_parser('append', help='Append children to a single parent')
+parser_append.add_argument('-n', '--count', type=int, default=100000, help='Number of children to append. Default: 100000')
+parser_append.set_defaults(func=bench_append)
+
+parser_memory = subparsers.add_parser('memory', help='Report the memory used per task')
+parser_memory.add_argument('-n', '--counts', type=int, nargs='+', default=[10000, 100000, 1000000],
+        help='Numbers of tasks to create. Default: 10000 100000 1000000')
+parser_memory.set_defaults(func=bench_memory)
+
+parser_load = subparsers.add_parser('load', help='Load a tree from a file')
+parser_load.add_argument('-n', '--count', type=int, default=200000, help='Number of tasks. Default: 200000')
+parser_load.add_argument('-f', '--format', choices=['xml', 'json'], default='xml', help='File format. Default: xml')
+parser_load.set_defaults(func=bench_load)
+
+parser_progress = subparsers.add_parser('progress', help='Compute the progress of every task')
+parser_progress.add_argument('-n', '--count', type=int, default=100000, help='Number of tasks. Default: 100000')
+parser_progress.set_defaults(func=bench_progress)
+
+parser_newtask = subparsers.add_parser('newtask', help='Add new tasks and update the task pane')
+parser_newtask.add_argument('-n', '--count', type=int, default=50000, help='Number of tasks. Default: 50000')
+parser_newtask.add_argument('-r', '--repeat', type=int, default=100, help='Number of new tasks. Default: 100')
+parser_newtask.set_defaults(func=bench_newtask)
+
+parser_paint = subparsers.add_parser('paint', help='Draw and scroll the task pane')
+parser_paint.add_argument('-n', '--count', type=int, default=100000, help='Number of tasks. Default: 100000')
+parser_paint.add_argument('-r', '--repeat', type=int, default=500, help='Number of rows to scroll. Default: 500')
+parser_paint.set_defaults(func=bench_paint)
+
+parser_sort = subparsers.add_parser('sort', help='Switch between sort orders')
+parser_sort.add_argument('-n', '--count', type=int, default=100000, help='Number of tasks. Default: 100000')
+parser_sort.add_argument('-r', '--repeat', type=int, default=5, help='Number of switches. Default: 5')
+parser_sort.set_defaults(func=bench_sort)
+
+parser_treelist = subparsers.add_parser('treelist', help='Compute the rows of the task pane and the schedule')
+parser_treelist.add_argument('-n', '--count', type=int, default=100000, help='Number of tasks. Default: 100000')
+parser_treelist.add_argument('-c', '--columnar', action='store_true', help='Use the columnar tree backend')
+parser_treelist.add_argument('-f', '--flat', action='store_true', help='Use the flat tree')
+parser_treelist.set_defaults(func=bench_treelist)
+
+args = parser.parse_args()
+args.func(args)
@@ -1,13 +1,19 @@
 import subprocess
 import logging
 from subprocess import PIPE, STDOUT
-from anytree import AnyNode
+from src.node import AnyTaskTreeAwareNode
+from src.timing import timings
 import json
 from datetime import timedelta, datetime, timezone
 
 timew_current_event = None
 timew_current_event_outdated = True
 
+# runs a timew command with `func` from subprocess, timed as phase
+def _timew(func, *args, **kwargs):
+    with timings.phase("timewarrior"):
+        return func(*args, **kwargs)
+
 def get_tags_categories(task):
     tags = [task.title]
     cats = set()
@@ -21,7 +27,7 @@ def get_tags(task, parents_as_tags=True):
 
     if parents_as_tags:
         p = task.parent
-        while not isinstance(p, AnyNode):
+        while not isinstance(p, AnyTaskTreeAwareNode):
             t, c = get_tags_categories(p)
             tags += t
             cats |= c
@@ -31,7 +37,7 @@ def get_tags(task, parents_as_tags=True):
 
 def _start_or_stop_task(task, start=True, parents_as_tags=True):
     start_or_stop = 'start' if start else 'stop'
-    cp = subprocess.run(['timew', start_or_stop] + get_tags(task, parents_as_tags) + [':yes', ':quiet'], check=False, stdout=PIPE, stderr=STDOUT)
+    cp = _timew(subprocess.run, ['timew', start_or_stop] + get_tags(task, parents_as_tags) + [':yes', ':quiet'], check=False, stdout=PIPE, stderr=STDOUT)
     _outdate_current_event()
     return cp.stdout.decode("utf-8")
 
@@ -41,13 +47,13 @@ def start_task(task, parents_as_tags=True):
 # stops whatever is running. doing otherwise easily leads to inconsitencies
 def stop():
     _outdate_current_event()
-    cp = subprocess.run('timew stop :quiet'.split(), check=False, stdout=PIPE, stderr=STDOUT)
+    cp = _timew(subprocess.run, 'timew stop :quiet'.split(), check=False, stdout=PIPE, stderr=STDOUT)
     return cp.stdout.decode("utf-8")
 
 
 def get_events(task, parents_as_tags=True, with_children=False):
     tags = get_tags(task, parents_as_tags)
-    exported = subprocess.check_output('timew export from 2000-01-01 to now :quiet'.split() + tags)
+    exported = _timew(subprocess.check_output, 'timew export from 2000-01-01 to now :quiet'.split() + tags)
     info = json.loads(exported.decode('utf-8'))
     exp = []
     for event in info:
@@ -97,7 +103,7 @@ def get_current_event():
 
 def _get_current_event_update():
     global timew_current_event
-    exported = subprocess.check_output('timew export :quiet'.split())
+    exported = _timew(subprocess.check_output, 'timew export :quiet'.split())
     info = json.loads(exported.decode('utf-8'))
     task = [event for event in info if event['id'] == 1][0]
 
@@ -142,8 +148,8 @@ def modify_hook(task_old, task_new, parents_as_tags=True):
     new_tags = get_tags(task_new, parents_as_tags)
 
     for t_id in ids:
-        subprocess.call(['timew', 'untag', '@' + str(t_id)] + old_tags + [':yes', ':quiet'])
-        subprocess.call(['timew', 'tag', '@' + str(t_id)] + new_tags + [':yes', ':quiet'])
+        _timew(subprocess.call, ['timew', 'untag', '@' + str(t_id)] + old_tags + [':yes', ':quiet'])
+        _timew(subprocess.call, ['timew', 'tag', '@' + str(t_id)] + new_tags + [':yes', ':quiet'])
 
     
 
@@ -0,0 +1,168 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import timedelta, date
+from heapq import merge
+from .events import TaskChange
+from .config import Config
+
+# the tasks shown on the schedule of a TaskTree (see Task.show_on_schedule)
+# in buckets per date, separately for the scheduled date, the due date and
+# the sort date. the dates of each kind that have a bucket are kept in a
+# sorted list of ordinals, so the tasks in a range of dates are found by
+# bisection and the buckets of the range. the buckets are built on first
+# use and updated with the changes of the tasks like the ScheduleIndex.
+class AgendaIndex:
+    DATES = ('sort_date', 'scheduled', 'due')
+
+    # fields the agenda depends on, categories only if the schedule is
+    # filtered by categories
+    FIELDS = ('due', 'scheduled', 'state', 'categories')
+
+    def __init__(self, tree):
+        self._tree = tree
+        self.outdate()
+
+    def outdate(self):
+        # per kind of date: ordinal -> tasks, as dict to remove in O(1)
+        self._buckets = None
+        # per kind of date: sorted ordinals of the buckets
+        self._ordinals = None
+        # task -> ordinals of its dates in the order of DATES
+        self._dates = None
+
+    def _build(self):
+        if not self._buckets is None:
+            return
+
+        self._buckets = {kind : {} for kind in self.DATES}
+        self._ordinals = {kind : [] for kind in self.DATES}
+        self._dates = {}
+
+        stack = list(self._tree.root.children)
+        while len(stack) != 0:
+            task = stack.pop()
+            self._add(task)
+            stack.extend(task.children)
+
+    def _add(self, task):
+        if not task.show_on_schedule:
+            return
+
+        ordinals = tuple(None if getattr(task, kind) is None else getattr(task, kind).toordinal()
+                            for kind in self.DATES)
+        self._dates[task] = ordinals
+
+        for kind, ordinal in zip(self.DATES, ordinals):
+            if ordinal is None:
+                continue
+
+            buckets = self._buckets[kind]
+            if not ordinal in buckets:
+                buckets[ordinal] = {}
+                insort(self._ordinals[kind], ordinal)
+
+            buckets[ordinal][task] = None
+
+    def _remove(self, task):
+        ordinals = self._dates.pop(task, None)
+        if ordinals is None:
+            return
+
+        for kind, ordinal in zip(self.DATES, ordinals):
+            if ordinal is None:
+                continue
+
+            bucket = self._buckets[kind][ordinal]
+            del bucket[task]
+
+            if len(bucket) == 0:
+                del self._buckets[kind][ordinal]
+                ordinals_kind = self._ordinals[kind]
+                del ordinals_kind[bisect_left(ordinals_kind, ordinal)]
+
+    def _update(self, task):
+        if task is self._tree.root:
+            return
+
+        self._remove(task)
+        self._add(task)
+
+    def _update_subtree(self, task, remove=False):
+        stack = [task]
+        while len(stack) != 0:
+            node = stack.pop()
+            if remove:
+                self._remove(node)
+            else:
+                self._update(node)
+            stack.extend(node.children)
+
+    def _update_path(self, task):
+        for node in task.iter_path_reverse():
+            self._update(node)
+
+    def __contains__(self, task):
+        self._build()
+        return task in self._dates
+
+    # tasks whose date of the kind `kind` lies in [first, last], sorted by
+    # that date. first and last are dates, None for an open end
+    def range(self, first=None, last=None, kind='sort_date'):
+        self._build()
+
+        ordinals = self._ordinals[kind]
+        start = 0 if first is None else bisect_left(ordinals, first.toordinal())
+        stop = len(ordinals) if last is None else bisect_right(ordinals, last.toordinal())
+
+        buckets = self._buckets[kind]
+        return [task for ordinal in ordinals[start:stop] for task in buckets[ordinal]]
+
+    # number of tasks in range(first, last, kind), summed over the buckets
+    # without listing the tasks
+    def count(self, first=None, last=None, kind='sort_date'):
+        self._build()
+
+        ordinals = self._ordinals[kind]
+        start = 0 if first is None else bisect_left(ordinals, first.toordinal())
+        stop = len(ordinals) if last is None else bisect_right(ordinals, last.toordinal())
+
+        buckets = self._buckets[kind]
+        return sum(len(buckets[ordinal]) for ordinal in ordinals[start:stop])
+
+    # tasks with a date of the kind `kind` before today
+    def overdue(self, kind='sort_date'):
+        return self.range(None, date.today() - timedelta(days=1), kind)
+
+    # tasks with a date of the kind `kind` in the `days` days from today on
+    def next_days(self, days=7, kind='sort_date'):
+        return self.range(date.today(), date.today() + timedelta(days=days - 1), kind)
+
+    def on_task_change(self, event):
+        if self._buckets is None:
+            return
+
+        filtered = Config.get("behaviour.filter_categories_schedule")
+        if event.change == TaskChange.FIELD and event.field == 'categories' and not filtered:
+            return
+
+        task = event.task
+
+        if event.change == TaskChange.FIELD:
+            if event.field == 'categories':
+                # see ScheduleIndex.on_task_change
+                self._update_subtree(task)
+                self._update_path(task)
+            else:
+                self._update(task)
+        elif event.change == TaskChange.ATTACHED:
+            self._update_subtree(task)
+            if filtered:
+                self._update_path(task)
+        elif event.change == TaskChange.DETACHED:
+            self._update_subtree(task, remove=True)
+            if filtered:
+                self._update_path(event.parent)
+
+# the agenda ranges of several trees merged by date, see AgendaIndex.range
+def merged_range(agendas, first=None, last=None, kind='sort_date'):
+    return list(merge(*(a.range(first, last, kind) for a in agendas),
+                    key=lambda t: getattr(t, kind)))
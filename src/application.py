@@ -6,10 +6,11 @@ from datetime import date, timedelta
 
 from .commandhandler import CommandHandler
 from .config import Config
+from .timing import timings
 from .task import TaskState
 from .treemanager import TreeManager
 from .geometry import *
-from .taskview import ListTask, DescriptionTask, ScheduleTask
+from .taskview import ListTask, DescriptionTask, ScheduleTask, list_row_key, volatile_key
 
 locale.setlocale(locale.LC_ALL, '')
 lcode = locale.getpreferredencoding()
@@ -29,6 +30,7 @@ class DeepcopySafeCursesWindow:
 class TreeTasksApplication:
     def resized(self):
         self._has_resized = True
+        self._redraw_all = True
 
     def handle_special_key(self, k):
         special_keys = {
@@ -56,6 +58,21 @@ class TreeTasksApplication:
 
         self._break_loop = False
         self._has_resized = True
+        self._coordinates_generation = None
+
+        # the state of the screen the retained parts were drawn for
+        # and the keys of the parts, see _retained
+        self._frame = None
+        self._drawn = {}
+        self._redraw_all = True
+
+        # the formatted rows of the tree per displayed task, see ListTask
+        self.row_cache = {}
+
+        # the views of the rows, per row index, see _pooled_view
+        self._task_views = {}
+        self._schedule_views = {}
+        self.description_task = None
 
     def run(self):
         try:
@@ -101,15 +118,41 @@ class TreeTasksApplication:
     def _calculate_coordinates(self):
         h, w = self.scr.getmaxyx()
         self._coordinates = WindowCoordinates.calculated(h, w)
+        self._coordinates_generation = Config.generation()
 
+    # the geometry of the panes and their rows, calculated again
+    # if the screen was resized or the configuration changed
     @property
     def coordinates(self):
-        if self._has_resized:
+        if self._has_resized or self._coordinates_generation != Config.generation():
             self._calculate_coordinates()
             self._has_resized = False
 
         return self._coordinates
 
+    # draws a part of the screen unless it was drawn with the same key since
+    # the screen was erased the last time. clear blanks its area beforehand
+    def _retained(self, part, key, draw, clear):
+        if self._drawn.get(part, self) == key:
+            return
+
+        clear()
+        draw()
+        self._drawn[part] = key
+
+    # draws `task` with the view kept for row i in `pool`,
+    # which is created on the first use of the row
+    def _pooled_view(self, pool, i, cls, task, geometry):
+        view = pool.get(i)
+        if view is None:
+            pool[i] = cls(task, geometry, self)
+        else:
+            view.bind(task, geometry)
+
+    def _clear(self, x, y, w, h=1):
+        for line in range(y, y + h):
+            self.scr.addstr(line, x, " " * w)
+
     def draw_tasks_decoration(self):
         cols = self.coordinates.columns
         x = self.coordinates.tasks.ul.x + 1
@@ -126,46 +169,123 @@ class TreeTasksApplication:
             self.scr.vline(y, x + cols.scheduled.x - 1, curses.ACS_VLINE, height)
             self.scr.addnstr(y, x + cols.scheduled.x, "Scheduled", cols.scheduled.w, curses.A_BOLD)
 
+    def _task_row_key(self, task):
+        if task is None:
+            return None
+
+        return (task,) + list_row_key(task, self)
+
+    @timings.timed("draw_tasks")
     def draw_tasks(self):
         x = self.coordinates.tasks.ul.x + 1
         y = self.coordinates.tasks.ul.y
         h = self.coordinates.tasks.h
+        w = self.coordinates.tasks.br.x - x + 1
 
         self.tm.current.viewport_height = h - 1
         dl = self.tm.current.view.display_list
-        self.draw_tasks_decoration()
         y += 1
 
-        for i, task in enumerate(dl):
-            ListTask(task, RectCoordinates(x, y + i, self.coordinates.tasks.br.x, y + i), self)
+        for i in range(h - 1):
+            task = dl[i] if i < len(dl) else None
+            self._retained(('tasks', i), self._task_row_key(task),
+                    lambda: task is None or self._pooled_view(self._task_views, i, ListTask, task,
+                        RectCoordinates(x, y + i, self.coordinates.tasks.br.x, y + i)),
+                    lambda: self._clear_task_row(x, y + i, w))
+
+        # the rows scrolled out of the viewport and deleted tasks are
+        # dropped, they are formatted again when they are displayed
+        if len(self.row_cache) > len(dl):
+            self.row_cache = {t : self.row_cache[t] for t in dl if t in self.row_cache}
 
+    # blanks a row of the tree, keeping the column separators
+    def _clear_task_row(self, x, y, w):
+        self._clear(x, y, w)
+
+        for separator in self.coordinates.columns.separators:
+            self.scr.vline(y, x + separator, curses.ACS_VLINE, 1)
+
+    @timings.timed("draw_description")
     def draw_description(self):
-        if not self.tm.current.cursor is None:
-            self.description_task = DescriptionTask(self.tm.current.cursor, self.coordinates.descr, self)
+        task = self.tm.current.cursor
+        descr = self.coordinates.descr
 
-    def draw_schedule(self):
+        def draw():
+            if task is None:
+                return
+
+            if self.description_task is None:
+                self.description_task = DescriptionTask(task, descr, self)
+            else:
+                self.description_task.bind(task, descr)
+
+        # the description shows the categories and the path of other tasks
+        self._retained('description',
+                (task, self.tm.current.generation, volatile_key()),
+                draw, lambda: self._clear(descr.ul.x, descr.ul.y, descr.w, descr.h))
+
+    def draw_schedule_decoration(self):
         x = self.coordinates.sched.ul.x
-        y = self.coordinates.sched.ul.y
-        w = self.coordinates.sched.w
-        h = self.coordinates.sched.h
-        title_str = "Schedule"
-        spacing_len = int((w - len(title_str)) / 2)
-        spacing = " " * (0 if spacing_len < 0 else spacing_len)
-        self.scr.addnstr(y, x, spacing + "Schedule", w, curses.A_BOLD)
-        y += 1
+        y = self.coordinates.sched.ul.y + 1
 
-        scoords = ScheduleCoordinates(w)
+        scoords = self.coordinates.schedule_columns
         self.scr.addnstr(y, x + scoords.due_offset, "Due", scoords.datewidth, curses.A_DIM)
         self.scr.addnstr(y, x + scoords.scheduled_offset, "Scheduled", scoords.datewidth, curses.A_DIM)
-        y += 2
+
+    def _schedule_row_key(self, task):
+        if task is None:
+            return None
+
+        # the path depends on the ancestors
+        if Config.get("appearance.description_show_path"):
+            generation = task.root.tasktree.generation
+        else:
+            generation = None
+
+        return (task, task.version, task.progress, generation,
+                task == self.tm.schedule.cursor,
+                task in self.tm.current.schedule_list,
+                volatile_key())
+
+    # the title of the schedule with the number of overdue tasks and of
+    # the tasks of the next seven days, counted by the agenda indices
+    def draw_schedule_title(self):
+        x = self.coordinates.sched.ul.x
+        y = self.coordinates.sched.ul.y
+        w = self.coordinates.sched.w
+
+        today = date.today()
+        overdue = self.tm.agenda_count(None, today - timedelta(days=1))
+        week = self.tm.agenda_count(today, today + timedelta(days=6))
+        title_str = "Schedule: {} overdue, {} this week".format(overdue, week)
+
+        def draw():
+            spacing_len = int((w - len(title_str)) / 2)
+            spacing = " " * (0 if spacing_len < 0 else spacing_len)
+            self.scr.addnstr(y, x, spacing + title_str, w, curses.A_BOLD)
+
+        self._retained('schedule_title', title_str, draw, lambda: self._clear(x, y, w))
+
+    @timings.timed("draw_schedule")
+    def draw_schedule(self):
+        self.draw_schedule_title()
+
+        x = self.coordinates.sched.ul.x
+        y = self.coordinates.sched.ul.y + 3
+        w = self.coordinates.sched.w
+        h = self.coordinates.sched.h
 
         max_tasks = int((h - 2) / 3)
 
         self.tm.schedule.viewport_height = max_tasks
         dl = self.tm.schedule.display_list
 
-        for i, task in enumerate(dl):
-            ScheduleTask(task, RectCoordinates(x, y + i * 3, self.coordinates.sched.br.x, y + i * 3 + 3), self)
+        for i in range(max_tasks):
+            task = dl[i] if i < len(dl) else None
+            self._retained(('schedule', i), self._schedule_row_key(task),
+                    lambda: task is None or self._pooled_view(self._schedule_views, i, ScheduleTask, task,
+                        RectCoordinates(x, y + i * 3, self.coordinates.sched.br.x, y + i * 3 + 3)),
+                    lambda: self._clear(x, y + i * 3, w, 2))
 
     def draw_filterstr(self):
         so_cat = self.tm.current.show_only_categories
@@ -193,22 +313,69 @@ class TreeTasksApplication:
 
         self.scr.addstr(self.coordinates.tasks.br.y + 1, self.coordinates.tasks.ul.x + 1, sortkey_str, curses.A_DIM)
 
+    @timings.timed("draw_tabbar")
     def draw_tabbar(self, x, w):
         tab_width = Config.get("appearance.tab_width")
         tab_count = int(w / tab_width)
         self.tm.tabs.viewport_height = tab_count
         display_tabs = self.tm.tabs.display_list 
 
-        for t in display_tabs:
-            if t == self.tm.current:
-                attr = curses.A_STANDOUT
-            else:
-                attr = curses.A_NORMAL
-            tab_name = t.name[-(tab_width - 3):].center(tab_width - 3)
-            self.scr.addstr(0, x, "[{}]".format(tab_name), attr)
-            x += tab_width
+        def draw():
+            tab_x = x
+            for t in display_tabs:
+                if t == self.tm.current:
+                    attr = curses.A_STANDOUT
+                else:
+                    attr = curses.A_NORMAL
+                tab_name = t.name[-(tab_width - 3):].center(tab_width - 3)
+                self.scr.addstr(0, tab_x, "[{}]".format(tab_name), attr)
+                tab_x += tab_width
+
+        self._retained('tabbar', (tuple(t.name for t in display_tabs), self.tm.current), draw,
+                lambda: self.scr.hline(0, x, curses.ACS_HLINE, tab_count * tab_width))
+
+    # the filter and the sort key are drawn on the line below the tree,
+    # which is the line of the message if the description is hidden.
+    # the timings of the previous frames follow the message if enabled
+    @timings.timed("draw_status")
+    def draw_status(self):
+        y, x = self.scr.getmaxyx()
 
-    def draw(self):
+        if Config.get("appearance.timing_show"):
+            timing_str = "| " + timings.summary() + " "
+        else:
+            timing_str = ""
+
+        def draw():
+            if len(self.tm.trees) >= 1:
+                self.draw_filterstr()
+                self.draw_sortkey()
+
+            message_str = "-> " + self.message + " "
+            self.scr.addnstr(y - 1, 0, message_str, x - 1)
+
+            timing_w = x - 1 - len(message_str)
+            if timing_str != "" and timing_w > 0:
+                self.scr.addnstr(y - 1, len(message_str), timing_str, timing_w, curses.A_DIM)
+
+        def clear():
+            self.scr.hline(y - 1, 0, curses.ACS_HLINE, x - 1)
+            if len(self.tm.trees) >= 1 and Config.get("appearance.description_show"):
+                self.scr.hline(self.coordinates.cross.y, self.coordinates.tasks.ul.x,
+                        curses.ACS_HLINE, self.coordinates.cross.x - 1)
+
+        if len(self.tm.trees) >= 1:
+            key = (self.message, timing_str, self.tm.current.sort_key, self.tm.current.sort_reverse,
+                    tuple(self.tm.current.show_only_categories), tuple(self.tm.current.hidden_categories))
+        else:
+            key = (self.message, timing_str)
+
+        self._retained('status', key, draw, clear)
+
+    # the parts of the screen that only change with its size, the
+    # configuration or the shown tree
+    @timings.timed("draw_frame")
+    def draw_frame(self):
         self.scr.erase()
         self.scr.border()
 
@@ -216,32 +383,55 @@ class TreeTasksApplication:
         self.scr.addstr(0, 1, wintitle, curses.A_BOLD)
         y, x = self.scr.getmaxyx()
 
-
         if len(self.tm.trees) >= 1:
-            self.draw_tabbar(len(wintitle) + 2, x - 2 - len(wintitle))
-            self.draw_tasks()
+            self.draw_tasks_decoration()
 
             if Config.get("appearance.schedule_show"):
-                self.draw_schedule()
+                self.draw_schedule_decoration()
                 self.scr.vline(1, self.coordinates.cross.x, 
                         curses.ACS_VLINE, y - 2)
 
             if Config.get("appearance.description_show"):
-                self.draw_description()
                 self.scr.hline(self.coordinates.cross.y, self.coordinates.tasks.ul.x,
                         curses.ACS_HLINE, self.coordinates.cross.x - 1)
-
-            self.draw_filterstr()
-            self.draw_sortkey()
         else:
             self.scr.addstr(0, len(wintitle) + 2, "No trees opened.")
 
-        self.scr.addstr(y - 1, 0, "-> " + self.message + " ")
+    # draws the parts of the screen that changed since the last frame. the
+    # screen is erased and drawn completely if its size, the configuration,
+    # the date or the shown tree changed, or if it was overwritten by editing
+    @timings.timed("draw")
+    def draw(self):
+        y, x = self.scr.getmaxyx()
+        frame = (y, x, date.today(), Config.generation(), self.tm.current)
+
+        if self._redraw_all or frame != self._frame:
+            self._frame = frame
+            self._drawn = {}
+            self.row_cache = {}
+            self._redraw_all = False
+            self.draw_frame()
+
+        wintitle = "TreeTasks"
+        if len(self.tm.trees) >= 1:
+            self.draw_tabbar(len(wintitle) + 2, x - 2 - len(wintitle))
+            self.draw_tasks()
+
+            if Config.get("appearance.schedule_show"):
+                self.draw_schedule()
+
+            if Config.get("appearance.description_show"):
+                self.draw_description()
+
+        self.draw_status()
 
         self.scr.refresh()
 
     def insert(self, x, y, maxc, maxl=1, s="", replace=False):
         # state-machine style bodgy editing/inserting of text
+        # the edited text is drawn over the retained parts of the screen
+        self._redraw_all = True
+
         # initialise editing
         lines = s.splitlines()
         if len(lines) == 0:
@@ -0,0 +1,278 @@
+from array import array
+from datetime import date
+from .task import TaskState
+from .events import TaskChange
+
+# ordinal used as key for tasks without date, as in TaskTree.update_order
+NO_DATE = date(2100, 1, 1).toordinal()
+
+NO_PRIORITY = -2**63
+
+# a task tree in parallel arrays, one row per node. row 0 is the root node,
+# missing links are -1, missing priorities are NO_PRIORITY and missing dates
+# are 0. the hierarchy is stored as first child/next sibling links, so
+# sibling groups can be reordered without moving rows. the rows are built in
+# pre-order and then kept up to date with the changes of the tasks: changed
+# fields are written to their row, attached subtrees get new rows at the end
+# and the rows of detached subtrees are unlinked and left empty. parents
+# come before their children in the rows either way.
+class TaskColumns:
+    # task fields held in the columns
+    FIELDS = ('categories', 'state', 'priority', 'due', 'scheduled', 'collapsed')
+
+    def __init__(self, root):
+        self.tasks = []
+        self.row = {}
+        self.categories = []
+        self.parent = array('l')
+        self.first_child = array('l')
+        self.next_sibling = array('l')
+        self.prev_sibling = array('l')
+        self.state = array('b')
+        self.priority = array('q')
+        self.due = array('l')
+        self.scheduled = array('l')
+        self.collapsed = array('b')
+        self.link_order = array('q')
+
+        # number of empty rows of detached tasks
+        self.dead = 0
+
+        self._append_subtree(root, -1)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    # appends rows for `node` and its descendants in pre-order. the row of
+    # `node` is linked as first child of the row `p`, the order of the links
+    # is set by sort_siblings
+    def _append_subtree(self, node, p):
+        stack = [(node, p)]
+        while len(stack) != 0:
+            node, p = stack.pop()
+            i = len(self.tasks)
+
+            self.tasks.append(node)
+            self.row[node] = i
+            self.parent.append(p)
+            self.first_child.append(-1)
+            self.next_sibling.append(-1)
+            self.prev_sibling.append(-1)
+
+            if p == -1:
+                # root node
+                self.categories.append(())
+                self.state.append(TaskState.PENDING.value)
+                self.priority.append(NO_PRIORITY)
+                self.due.append(0)
+                self.scheduled.append(0)
+                self.collapsed.append(False)
+                self.link_order.append(0)
+            else:
+                self.categories.append(())
+                self.state.append(0)
+                self.priority.append(0)
+                self.due.append(0)
+                self.scheduled.append(0)
+                self.collapsed.append(False)
+                self.link_order.append(node._link_order)
+                for field in self.FIELDS:
+                    self._write(i, node, field)
+
+                self._link(i, p)
+
+            stack.extend((c, i) for c in reversed(node.children))
+
+    def _write(self, i, task, field):
+        if field == 'categories':
+            self.categories[i] = task.categories
+        elif field == 'state':
+            self.state[i] = task.state.value
+        elif field == 'priority':
+            self.priority[i] = NO_PRIORITY if task.priority is None else task.priority
+        elif field == 'due':
+            self.due[i] = 0 if task.due is None else task.due.toordinal()
+        elif field == 'scheduled':
+            self.scheduled[i] = 0 if task.scheduled is None else task.scheduled.toordinal()
+        elif field == 'collapsed':
+            self.collapsed[i] = task.collapsed
+
+    def _link(self, i, p):
+        first = self.first_child[p]
+        self.next_sibling[i] = first
+        if first != -1:
+            self.prev_sibling[first] = i
+        self.first_child[p] = i
+
+    def _unlink(self, i):
+        p = self.parent[i]
+        prev = self.prev_sibling[i]
+        nxt = self.next_sibling[i]
+
+        if prev == -1:
+            self.first_child[p] = nxt
+        else:
+            self.next_sibling[prev] = nxt
+        if nxt != -1:
+            self.prev_sibling[nxt] = prev
+
+        self.next_sibling[i] = -1
+        self.prev_sibling[i] = -1
+
+    # empties the rows of `task` and its descendants. empty rows are no
+    # child of any row, have no task and are neither shown nor scheduled
+    def _remove_subtree(self, task):
+        i = self.row.get(task)
+        if i is None:
+            return
+
+        self._unlink(i)
+        stack = [task]
+        while len(stack) != 0:
+            node = stack.pop()
+            i = self.row.pop(node, None)
+            if i is None:
+                continue
+
+            self.tasks[i] = None
+            self.parent[i] = 0
+            self.first_child[i] = -1
+            self.categories[i] = ()
+            self.state[i] = TaskState.CANCELLED.value
+            self.due[i] = 0
+            self.scheduled[i] = 0
+            self.dead += 1
+            stack.extend(node.children)
+
+    def on_task_change(self, event):
+        task = event.task
+
+        if event.change == TaskChange.FIELD:
+            i = self.row.get(task)
+            if not i is None:
+                self._write(i, task, event.field)
+        elif event.change == TaskChange.ORDER:
+            i = self.row.get(task)
+            if not i is None:
+                self.link_order[i] = task._link_order
+        elif event.change == TaskChange.ATTACHED:
+            p = self.row.get(task.parent)
+            if not p is None:
+                self._remove_subtree(task)
+                self._append_subtree(task, p)
+        elif event.change == TaskChange.DETACHED:
+            self._remove_subtree(task)
+
+    def children(self, i):
+        c = self.first_child[i]
+        while c != -1:
+            yield c
+            c = self.next_sibling[c]
+
+    def sort_date(self, i):
+        due = self.due[i]
+        scheduled = self.scheduled[i]
+        if due == 0:
+            return scheduled
+        if scheduled == 0:
+            return due
+
+        return min(due, scheduled)
+
+    def tagged(self, i):
+        return self.state[i] != TaskState.PENDING.value
+
+    # relinks every sibling group in the order given by key, equal
+    # siblings are kept in natural order as in TaskTreeSorter
+    def sort_siblings(self, key, reverse=False, tagged_below=False):
+        for p in range(len(self)):
+            if self.first_child[p] == -1 or self.next_sibling[self.first_child[p]] == -1:
+                continue
+
+            rows = list(self.children(p))
+            rows.sort(key=self.link_order.__getitem__)
+            rows.sort(key=key, reverse=reverse)
+            if tagged_below:
+                rows.sort(key=self.tagged)
+
+            self.first_child[p] = rows[0]
+            self.prev_sibling[rows[0]] = -1
+            for a, b in zip(rows, rows[1:]):
+                self.next_sibling[a] = b
+                self.prev_sibling[b] = a
+            self.next_sibling[rows[-1]] = -1
+
+    # rows of tasks that have one of the categories in `categories`
+    def _category_matches(self, categories):
+        return array('b', (len(categories.intersection(c)) != 0 for c in self.categories))
+
+    # marks rows having a descendant with match set
+    def _descendant_matches(self, match):
+        below = array('b', bytes(len(self)))
+        for i in range(len(self) - 1, 0, -1):
+            if match[i] or below[i]:
+                below[self.parent[i]] = True
+
+        return below
+
+    # rows of tasks that are visible by the category filters,
+    # see Task._category_visible
+    def category_visible(self, hidden, show_only, inherit_show_only):
+        if show_only is None or len(show_only) == 0:
+            return array('b', (len(hidden.intersection(c)) == 0 for c in self.categories))
+
+        match = self._category_matches(show_only)
+        visible = self._descendant_matches(match)
+        inherited = array('b', bytes(len(self)))
+
+        # parents come before their children in the rows
+        for i in range(1, len(self)):
+            p = self.parent[i]
+            if p != 0:
+                inherited[i] = match[p] or inherited[p]
+
+            if match[i] or (inherit_show_only and inherited[i]):
+                visible[i] = True
+
+        return visible
+
+    # rows shown in the tree in pre-order, see Task.show. subtrees of
+    # hidden or collapsed tasks are skipped without visiting their rows
+    def visible_rows(self, category_visible, show_done, show_cancelled):
+        done = TaskState.DONE.value
+        cancelled = TaskState.CANCELLED.value
+
+        rows = []
+        stack = [self.first_child[0]]
+        while len(stack) != 0:
+            i = stack.pop()
+            if i == -1:
+                continue
+
+            stack.append(self.next_sibling[i])
+
+            if not show_done and self.state[i] == done:
+                continue
+            if not show_cancelled and self.state[i] == cancelled:
+                continue
+            if not category_visible[i]:
+                continue
+
+            rows.append(i)
+            if not self.collapsed[i]:
+                stack.append(self.first_child[i])
+
+        return rows
+
+    # rows shown on the schedule, sorted by date and priority,
+    # see Task.show_on_schedule and TaskTree.schedule_list. equal rows
+    # stay in the order of the rows, which is natural pre-order for the
+    # rows built at once and the order of attaching for the others
+    def schedule_rows(self, category_visible=None):
+        rows = [i for i in range(1, len(self))
+                if self.sort_date(i) != 0 and self.state[i] == TaskState.PENDING.value
+                    and (category_visible is None or category_visible[i])]
+        rows.sort(key=lambda i: 0 if self.priority[i] == NO_PRIORITY else self.priority[i], reverse=True)
+        rows.sort(key=self.sort_date)
+
+        return rows
@@ -2,6 +2,7 @@ import logging
 
 from .commands import Commands
 from .config import Config
+from .timing import timings
 
 class CommandHandler:
     config_call_map = {
@@ -62,6 +63,7 @@ class CommandHandler:
             'schedule_down' : Commands.schedule_down,
             'schedule_up' : Commands.schedule_up,
             'schedule_goto_today' : Commands.schedule_goto_today,
+            'schedule_goto_date' : Commands.schedule_goto_date,
             'schedule_top' : Commands.schedule_top,
             'show_only_categories' : Commands.show_only_categories,
             'show_all_categories' : Commands.show_all_categories,
@@ -89,6 +91,8 @@ class CommandHandler:
             'toggle_flat_tree' : lambda c: Commands.toggle_config(c, "behaviour.flat_tree"),
             'priority_up' : Commands.priority_up,
             'priority_down' : Commands.priority_down,
+            'toggle_timing' : lambda c: Commands.toggle_config(c, "appearance.timing_show"),
+            'dump_timing' : Commands.dump_timing,
     }
 
     def __init__(self, tasktree_application):
@@ -115,6 +119,7 @@ class CommandHandler:
         key_actions_last[key_or_keychain[-1]] = action_callable
 
 
+    @timings.timed("key")
     def handle(self, key):
         logging.debug("key handler: {} (utf-8), {} (decoded)".format(str(key.encode("utf-8")), key))
         if self.keychain_scope == None:
@@ -2,10 +2,13 @@ from datetime import date, timedelta
 from anytree import TreeError, PreOrderIter
 from functools import wraps
 import copy
+import logging
 import os
 
 from .tree import TaskTreeSortKey
+from .taskview import EditableDate
 from .config import Config
+from .timing import timings
 
 def task_modification(func):
     def run_recursive(func_bound, it):
@@ -234,9 +237,28 @@ class Commands:
     def schedule_goto_today(self):
         self.app.tm.schedule.move_today()
 
+    def schedule_goto_date(self):
+        s = self.app.get_input("Go to date")
+        if s == "":
+            return
+
+        d = EditableDate.parse_date(s)
+        if d is None:
+            self.app.message = "Unable to parse date"
+        else:
+            self.app.tm.schedule.move_to_date(d)
+
     def schedule_top(self):
         self.app.tm.schedule.move_top()
 
+    # without a log file (see --log) the timings are shown on the status line
+    def dump_timing(self):
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            timings.log()
+            self.app.message = "Timings written to the log"
+        else:
+            self.app.message = "No log file set, timings: " + timings.summary()
+
     def hide_categories(self):
         cats = self.app.get_input("Hide").split()
         self.app.tm.current.hide_categories(cats)
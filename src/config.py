@@ -2,6 +2,9 @@ import configparser
 import logging
 import curses
 class Config:
+    # number of changes of the configuration
+    _generation = 0
+
     _config = {
             'appearance': {
                 'tasks_lines' : 50,
@@ -33,7 +36,8 @@ class Config:
                 'schedule_show_path' : True,
                 'description_path_maxlength' : 16,
                 'schedule_path_maxlength' : 8,
-                'flat_tree_path_maxlength' : 20
+                'flat_tree_path_maxlength' : 20,
+                'timing_show' : False
             },
             'keys' : {
                 'down' : 'j',
@@ -48,6 +52,7 @@ class Config:
                 'schedule_up' : 'm',
                 'schedule_top' : 'M',
                 'schedule_goto_today' : 'N',
+                'schedule_goto_date' : 'B',
 
                 'move_cursor_up' : 'K',
                 'move_cursor_down' : 'J',
@@ -131,7 +136,10 @@ class Config:
                 'new_tab' : 't',
 
                 'timewarrior_start' : 'w',
-                'timewarrior_stop' : 'W'
+                'timewarrior_stop' : 'W',
+
+                'toggle_timing' : 'Pt',
+                'dump_timing' : 'Pd'
             },
             'behaviour' : {
                 'scrolloffset_tree' : 2,
@@ -148,7 +156,8 @@ class Config:
                 'global_schedule' : True,
                 'primary_movement_hierarchic' : True,
                 'flat_tree' : False,
-                'inherit_categories_showonly' : True
+                'inherit_categories_showonly' : True,
+                'columnar_backend' : False
             },
             'plugins' : {
                 'timewarrior' : False,
@@ -162,6 +171,7 @@ class Config:
 
     @staticmethod
     def load(path):
+        Config._generation += 1
         config = configparser.ConfigParser()
         config.read(path)
         for sec_name in config:
@@ -200,6 +210,11 @@ class Config:
         if not section in Config._config:
             raise KeyError("Given section not existing")
         Config._config[section][key] = value
+        Config._generation += 1
+
+    @staticmethod
+    def generation():
+        return Config._generation
 
     @staticmethod
     def get_section(section):
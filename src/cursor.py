@@ -1,6 +1,8 @@
-from anytree import AnyNode, TreeError
+from anytree import TreeError
+from .node import AnyTaskTreeAwareNode
 from datetime import date
 from .config import *
+from .rows import TaskRows
 import logging
 
 class CursorException(Exception):
@@ -17,15 +19,21 @@ class Scroller:
             scrolloffset = 0
 
         self.scrolloffset = scrolloffset
-        self.list = [None]
         self.cursor = None
         self.display_list = [None]
 
-    def get_display_list(self, cursor, current_list):
+        # position of the cursor in the list and in the display
+        # list at the last call of get_display_list
+        self.index = 0
+        self.cursor_line = 0
+
+    # current_list may be any sequence supporting len, index and slicing,
+    # only the displayed part of it is accessed. index is the position of
+    # the cursor in current_list, it is looked up if not given
+    def get_display_list(self, cursor, current_list, index=None):
         if cursor is None:
             self.cursor = cursor
             self.display_list = current_list[:self.viewport_height]
-            self.list = current_list
 
             return self.display_list
 
@@ -34,24 +42,24 @@ class Scroller:
 #
 #        assert cursor in current_list
 
-        if not cursor in current_list:
+        if index is None and not cursor in current_list:
             logging.warning("Cursor not in current list.")
 
             self.cursor = None
             self.display_list = current_list[:self.viewport_height]
-            self.list = current_list
 
             return self.display_list
-        else:
+        elif index is None:
             index_new = current_list.index(cursor)
+        else:
+            index_new = index
 
         if self.cursor is None:
             index_old = 0
             cursor_line_old = 0
         else:
-            assert self.cursor in self.list
-            index_old = self.list.index(self.cursor)
-            cursor_line_old = self.display_list.index(self.cursor)
+            index_old = self.index
+            cursor_line_old = self.cursor_line
 
         h = self.viewport_height
         cursor_line_new = cursor_line_old + index_new - index_old
@@ -59,14 +67,19 @@ class Scroller:
 
         if cursor_line_new >= index_new:
             cursor_line_new = index_new
-        elif h - cursor_line_new >= len(current_list) - index_new and h < len(current_list):
-            delta = h - cursor_line_new - len(current_list) + index_new
-            cursor_line_new = cursor_line_new + delta# + 1
+        else:
+            # rows from the cursor on, counted up to h + 1
+            remaining = len(current_list[index_new:index_new + h + 1])
+
+            if h - cursor_line_new >= remaining and h < index_new + remaining:
+                delta = h - cursor_line_new - remaining
+                cursor_line_new = cursor_line_new + delta# + 1
 
         start = index_new - cursor_line_new 
-        self.list = current_list[:]
         self.cursor = cursor
-        self.display_list = current_list[start:][:h]
+        self.index = index_new
+        self.cursor_line = cursor_line_new
+        self.display_list = current_list[start:start + h]
 
         return self.display_list
 
@@ -76,21 +89,60 @@ class ListCursor:
         self.cursor = None
         self._scroller = Scroller(0, scrolloffset)
 
+    @staticmethod
+    def _find(lst, value):
+        try:
+            return lst.index(value)
+        except ValueError:
+            return None
+
+    # index of the cursor in lst or None if it is not in there. lists with
+    # a generation stamp (see rows.py) are only searched again after
+    # they changed, other lists on every call
+    def _cursor_index(self, lst):
+        generation = getattr(lst, 'generation', None)
+        if generation is None or generation != self._generation:
+            self._index = self._find(lst, self._cursor)
+            self._generation = generation
+
+        return self._index
+
     @property
     def cursor(self):
-        if not self._cursor in self.list:
-            if len(self.list) == 0:
+        lst = self.list
+        if self._cursor_index(lst) is None:
+            first = lst[:1]
+            if len(first) == 0:
                 self._cursor = None
             else:
-                self._cursor = self.list[0]
+                self._cursor = first[0]
+                self._index = 0
 
         return self._cursor
 
     @cursor.setter
     def cursor(self, value):
-        if value not in self.list and not value is None:
+        lst = self.list
+        self._cursor = value
+        self._index = self._find(lst, value)
+        self._generation = getattr(lst, 'generation', None)
+
+        if self._index is None and not value is None:
             logging.error("setting cursor {} to a value not in the list".format(str(value)[:30]))
+
+    # sets the cursor to `value` at the known `index` of the list,
+    # without searching the list
+    def _set_cursor(self, value, index):
         self._cursor = value
+        self._index = index
+        self._generation = getattr(self.list, 'generation', None)
+
+    # index of the cursor in the list, None if the list is empty
+    @property
+    def index(self):
+        # reading the cursor updates the index
+        self.cursor
+        return self._index
 
     @property
     def list(self):
@@ -98,7 +150,8 @@ class ListCursor:
 
     @property
     def display_list(self):
-        return self._scroller.get_display_list(self.cursor, self.list)
+        cursor = self.cursor
+        return self._scroller.get_display_list(cursor, self.list, self._index)
 
     @property
     def viewport_height(self):
@@ -117,12 +170,12 @@ class TabbarCursor(ListCursor):
         super().__init__(list_descriptor, Config.get("behaviour.scrolloffset_tabbar"))
 
     def next(self):
-        index = self.list.index(self.cursor)
+        index = self.index
         index += 1 - len(self.list)
         self.cursor = self.list[index]
 
     def prev(self):
-        index = self.list.index(self.cursor)
+        index = self.index
         index -= 1
         self.cursor = self.list[index]
 
@@ -133,31 +186,37 @@ class ScheduleCursor(ListCursor):
         self.move_callback = move_callback
 
     def move_up(self):
-        index = self.list.index(self.cursor)
-        self.cursor= self.list[max(0, index - 1)]
+        index = max(0, self.index - 1)
+        self._set_cursor(self.list[index], index)
 
         self.move_callback()
 
     def move_down(self):
-        index = self.list.index(self.cursor)
-        self.cursor= self.list[min(len(self.list) - 1, index + 1)]
+        index = min(len(self.list) - 1, self.index + 1)
+        self._set_cursor(self.list[index], index)
 
         self.move_callback()
 
     def move_top(self):
-        self.cursor = self.list[0]
+        self._set_cursor(self.list[0], 0)
 
         self.move_callback()
 
-    def move_today(self):
-        while self.cursor.sort_date > date.today():
-            self.move_up()
+    # moves to the first task on or after `d`, or to the last task.
+    # the schedule lists count the tasks before a date by bisection
+    def move_to_date(self, d):
+        tasks = self.list
+        if len(tasks) == 0:
+            return
 
-        while self.cursor.sort_date < date.today():
-            self.move_down()
+        index = min(tasks.count_before((d,)), len(tasks) - 1)
+        self._set_cursor(tasks[index], index)
 
         self.move_callback()
 
+    def move_today(self):
+        self.move_to_date(date.today())
+
 class TreeCursor(ListCursor):
     def __init__(self, list_descriptor):
         super().__init__(list_descriptor, Config.get("behaviour.scrolloffset_tree"))
@@ -174,10 +233,10 @@ class TreeCursor(ListCursor):
             return
 
         tasks = self.list
-        index_new = tasks.index(self.cursor) + delta
+        index_new = self.index + delta
 
         # roundtrip
-        if index_new >= len(tasks):
+        if index_new > 0 and len(tasks[index_new:index_new + 1]) == 0:
             if Config.get("behaviour.roundtrip"):
                 index_new -= len(tasks)
             else:
@@ -188,28 +247,44 @@ class TreeCursor(ListCursor):
             else:
                 index_new = 0
 
-        self.cursor = tasks[index_new]
+        if index_new < 0:
+            # moved by more than the length of the list
+            self.cursor = tasks[index_new]
+        else:
+            self._set_cursor(tasks[index_new], index_new)
 
-    def _move_hierarchic(self, up=True):
+    # the displayed children of `parent` in the order of the list. the rows
+    # of the tree keep them per parent, the flat tree list is scanned
+    def displayed_children(self, parent):
+        tasks = self.list
+        if isinstance(tasks, TaskRows):
+            return tasks.visible_children(parent)
+
+        return [t for t in tasks if t.parent is parent]
+
+    # auto_move_up overrides behaviour.auto_move_up if given
+    def _move_hierarchic(self, up=True, auto_move_up=None):
         if not self._move_check():
             return
 
+        if auto_move_up is None:
+            auto_move_up = Config.get("behaviour.auto_move_up")
+
         if Config.get("behaviour.flat_tree"):
             return self.move_flat(-1 if up else 1)
 
-        displayed_children = [t for t in self.list
-                                if t in self.cursor.parent.children]
+        displayed_children = self.displayed_children(self.cursor.parent)
 
         cursor_index = displayed_children.index(self.cursor)
         end_index = 0 if up else len(displayed_children) - 1
 
         if len(displayed_children) == 1 or cursor_index == end_index:
-            if     (isinstance(self.cursor.parent, AnyNode) and
+            if     (isinstance(self.cursor.parent, AnyTaskTreeAwareNode) and
                     Config.get("behaviour.roundtrip")):
                 # roundtrip in root level
                 self.cursor = displayed_children[-1 if up else 0]
-            elif   (not isinstance(self.cursor.parent, AnyNode) and
-                    Config.get("behaviour.auto_move_up")):
+            elif   (not isinstance(self.cursor.parent, AnyTaskTreeAwareNode) and
+                    auto_move_up):
                 # auto move up
                 self.move_treeup()
                 if not up:
@@ -221,7 +296,18 @@ class TreeCursor(ListCursor):
         else:
             # normal movement
             delta = -1 if up else 1
-            self.cursor = displayed_children[cursor_index + delta]
+            sibling = displayed_children[cursor_index + delta]
+
+            tasks = self.list
+            if isinstance(tasks, TaskRows):
+                # the sibling is the rows of a subtree away
+                if up:
+                    index = self.index - tasks.subtree_rows(sibling)
+                else:
+                    index = self.index + tasks.subtree_rows(self.cursor)
+                self._set_cursor(sibling, index)
+            else:
+                self.cursor = sibling
 
     def move_hierarchic_up(self):
         self._move_hierarchic(True)
@@ -229,15 +315,15 @@ class TreeCursor(ListCursor):
     def move_hierarchic_down(self):
         self._move_hierarchic(False)
 
-    def move_hierarchic(self, delta):
+    def move_hierarchic(self, delta, auto_move_up=None):
         tasks = self.list
 
         while delta > 0:
-            self._move_hierarchic(False)
+            self._move_hierarchic(False, auto_move_up)
             delta -= 1
 
         while delta < 0:
-            self._move_hierarchic(True)
+            self._move_hierarchic(True, auto_move_up)
             delta += 1
 
     def move_treeup(self):
@@ -246,7 +332,7 @@ class TreeCursor(ListCursor):
 
         tasks = self.list
 
-        if isinstance(self.cursor.parent, AnyNode):
+        if isinstance(self.cursor.parent, AnyTaskTreeAwareNode):
             return
 
         self.cursor = self.cursor.parent
@@ -262,7 +348,7 @@ class TreeCursor(ListCursor):
             self.cursor.toggle_collapse()
             tasks = self.list
 
-        displayed_children = [t for t in self.cursor.children if t in self.list]
+        displayed_children = self.displayed_children(self.cursor)
         if len(displayed_children) == 0:
             raise TreeError("Cursor has no children")
         else:
@@ -0,0 +1,47 @@
+from enum import Enum
+
+class TaskChange(Enum):
+    FIELD = 0
+    ATTACHED = 1
+    DETACHED = 2
+    ORDER = 3
+
+# a change of `task`. field is the name of the changed
+# property for FIELD changes and None otherwise, parent is
+# the former parent of the task for DETACHED changes
+class TaskEvent:
+    __slots__ = ("change", "task", "field", "parent")
+
+    def __init__(self, change, task, field=None, parent=None):
+        self.change = change
+        self.task = task
+        self.field = field
+        self.parent = parent
+
+    def __repr__(self):
+        return "TaskEvent({}, {}, {})".format(self.change, self.task.title, self.field)
+
+# distributes the changes of the tasks of a tree to its subscribers.
+# subscribers can restrict the events they get to some kinds of changes
+# and, for FIELD changes, to some fields
+class TaskEventBus:
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback, changes=None, fields=None):
+        self._subscribers.append((callback,
+                None if changes is None else set(changes),
+                None if fields is None else set(fields)))
+
+    def unsubscribe(self, callback):
+        self._subscribers = [s for s in self._subscribers if s[0] != callback]
+
+    def publish(self, event):
+        for callback, changes, fields in self._subscribers:
+            if not changes is None and not event.change in changes:
+                continue
+
+            if event.change == TaskChange.FIELD and not fields is None and not event.field in fields:
+                continue
+
+            callback(event)
@@ -61,6 +61,7 @@ class TaskWindowColumns:
         self._scheduled.w = self._get_column_width("scheduled")
         self._due.w = self._get_column_width("due")
         self._limit_col_widths()
+        self._real_sum = self._sum()
 
         column_order = Config.get("appearance.columns")
         x_start = self.taskwindow_width - self.real_sum
@@ -69,11 +70,14 @@ class TaskWindowColumns:
             this_col.x = x_start
             x_start += this_col.w + 1
 
+        # x of the separators left of the columns
+        self.separators = [self.column_by_letter(cname).x - 1 for cname in column_order]
+
     # limits the calculated column widths so they
     # fill at maximum appearance.columns_max_total_ratio * task_w
     # use only columns that will be displayed
     def _limit_col_widths(self):
-        wsum = self.real_sum
+        wsum = self._sum()
 
         if wsum > Config.get("appearance.columns_max_total_ratio") * self.taskwindow_width:
             f = Config.get("appearance.columns_max_total_ratio") * self.taskwindow_width / wsum 
@@ -105,8 +109,13 @@ class TaskWindowColumns:
         elif letter == 's':
             return self.scheduled
 
+    # the width of the columns with the spacing between them,
+    # calculated with the columns
     @property
     def real_sum(self):
+        return self._real_sum
+
+    def _sum(self):
         cconf = Config.get("appearance.columns")
         wsum = 0
         for coln in cconf:
@@ -140,6 +149,7 @@ class WindowCoordinates:
     descr : RectCoordinates
     cross: Point
     columns : TaskWindowColumns
+    schedule_columns : ScheduleCoordinates
 
     def __init__(self):
         self.tasks = RectCoordinates()
@@ -147,6 +157,7 @@ class WindowCoordinates:
         self.descr = RectCoordinates()
         self.cross = Point()
         self.columns = TaskWindowColumns()
+        self.schedule_columns = ScheduleCoordinates(0)
 
     @classmethod
     def calculated(cls, screen_height, screen_width):
@@ -196,6 +207,8 @@ class WindowCoordinates:
         c.sched.br.y = c.descr.br.y
         c.descr.br.x = c.tasks.br.x
 
+        # the geometry of the rows, shared by all of them
         c.columns = TaskWindowColumns(c.tasks.w - 1)
+        c.schedule_columns = ScheduleCoordinates(c.sched.w)
 
         return c
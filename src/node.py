@@ -1,4 +1,4 @@
-from anytree import NodeMixin, AnyNode, TreeError
+from anytree import NodeMixin, LightNodeMixin, AnyNode, TreeError
 import logging
 
 class OrderedNodeMixin(NodeMixin):
@@ -85,22 +85,38 @@ class OrderedNodeMixin(NodeMixin):
         self.children = children
 
 
-class LinkedListNodeMixin(NodeMixin):
-    @property
-    def link_index(self):
-        i = 0
-        it = self._link_prev
+# based on LightNodeMixin, the slotted variant of NodeMixin, since
+# tasks are by far the most numerous objects. subclasses have to
+# declare __slots__ too, otherwise their instances get a __dict__
+class LinkedListNodeMixin(LightNodeMixin):
+    __slots__ = ("__link_next", "__link_prev", "__link_order",
+                 "__link_head", "__link_tail",
+                 "__label_enter", "__label_exit", "__label_root",
+                 "__labels_outdated")
+
+    # spacing of the order keys of consecutive links. inserting between two
+    # links takes the midpoint of their keys, the siblings are renumbered
+    # only if there is no gap left
+    LINK_ORDER_GAP = 1 << 16
 
-        if it is None:
-            return i
+    # spacing of the nested interval labels after renumbering,
+    # see _update_labels
+    LABEL_GAP = 1 << 32
 
-        i += 1
-        while it._link_prev is not None:
-            assert it != it._link_prev
-            it = it._link_prev
-            i += 1
+    # anytree's child list itself, in natural order. unlike children it
+    # is not copied on every access, so it must not be modified
+    @property
+    def _child_list(self):
+        return self._LightNodeMixin__children_or_empty
+
+    # position in the linked list of the siblings, found by bisecting
+    # anytree's child list, which is kept in natural order
+    @property
+    def link_index(self):
+        if self.parent is None:
+            return 0
 
-        return i
+        return self._child_position(self._link_order)
 
     @property
     def index(self):
@@ -109,35 +125,14 @@ class LinkedListNodeMixin(NodeMixin):
 
         return list(self.parent.children).index(self)
 
-    def sort_children_link(self, reverse=False):
-        self.sort_children(key=lambda node: node.link_index, reverse=reverse)
-
-    def sort_tree_link(self, reverse=False):
-        self.sort_tree(key=lambda node: node.link_index, reverse=reverse)
-    
-    def sort_children(self, key=None, reverse=False):
-        for child in self.children:
-            child._block_hooks = True
-
-        children = list(self.children)
-        children.sort(key=key, reverse=reverse)
-        self.children = children
-
-        for child in self.children:
-            child._block_hooks = False
-
-    def sort_tree(self, key=None, reverse=False):
-        self.sort_children(key=key, reverse=reverse)
-
-        for child in self.children:
-            child.sort_tree(key=key, reverse=reverse)
-
     def move_backwards(self):
         self._link_prev.insert_before(self)
 
     def move_forwards(self):
         self._link_next.insert_after(self)
 
+    # returns the index of `node` in anytree's child list of the parent,
+    # see _move_to_link_position
     def _insert_prepare(self, node):
         if not isinstance(node, LinkedListNodeMixin):
             raise ValueError("Node is not of type OrderedNodeMixin")
@@ -146,26 +141,67 @@ class LinkedListNodeMixin(NodeMixin):
             raise TreeError("Cannot insert self before or after itself")
 
         node.parent = self.parent
+        index = node._child_position(node._link_order)
         node.remove_from_linked_list()
+        return index
 
     # insert the given node before/after this node
     def insert_before(self, node):
-        self._insert_prepare(node)
+        index = self._insert_prepare(node)
 
         node._link_prev = self._link_prev
         if not self._link_prev is None:
             self._link_prev._link_next = node
         self._link_prev = node
         node._link_next = self
+        if node._link_prev is None:
+            self.parent._link_head = node
+        node._update_link_order()
+        node._move_to_link_position(index)
+        node._update_labels()
+        node._post_reorder()
 
     def insert_after(self, node):
-        self._insert_prepare(node)
+        index = self._insert_prepare(node)
 
         node._link_next = self._link_next
         if not self._link_next is None:
             self._link_next._link_prev = node
         self._link_next = node
         node._link_prev = self
+        if node._link_next is None:
+            self.parent._link_tail = node
+        node._update_link_order()
+        node._move_to_link_position(index)
+        node._update_labels()
+        node._post_reorder()
+
+    # index of the first child of the parent whose order key is not below
+    # `order`. anytree's child lists are kept in natural order, so they
+    # are sorted by the order keys and bisected
+    def _child_position(self, order, children=None):
+        if children is None:
+            children = self.parent._LightNodeMixin__children_or_empty
+
+        lo = 0
+        hi = len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if children[mid]._link_order < order:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    # moves this node in anytree's child list of the parent from `index`
+    # to its position in the linked list, so the child list is kept in
+    # natural order. the other children keep their order when the links
+    # are renumbered, so the position is found by the new order key
+    def _move_to_link_position(self, index):
+        children = self.parent._LightNodeMixin__children_or_empty
+        del children[index]
+        children.insert(self._child_position(self._link_order, children), self)
 
     def insert(self, node, before=True):
         if before:
@@ -208,6 +244,41 @@ class LinkedListNodeMixin(NodeMixin):
             raise TreeError("Setting a link loop")
         self.__link_prev = value
 
+    @property
+    def _link_order(self):
+        try:
+            return self.__link_order
+        except AttributeError:
+            return 0
+
+    @_link_order.setter
+    def _link_order(self, value):
+        self.__link_order = value
+
+    # assigns an order key between the keys of the neighbouring links
+    def _update_link_order(self):
+        prev = self._link_prev
+        nxt = self._link_next
+
+        if prev is None and nxt is None:
+            self._link_order = 0
+        elif prev is None:
+            self._link_order = nxt._link_order - self.LINK_ORDER_GAP
+        elif nxt is None:
+            self._link_order = prev._link_order + self.LINK_ORDER_GAP
+        elif nxt._link_order - prev._link_order > 1:
+            self._link_order = (prev._link_order + nxt._link_order) // 2
+        else:
+            self._renumber_links()
+
+    def _renumber_links(self):
+        it = self.parent._link_head
+        order = 0
+        while not it is None:
+            it._link_order = order
+            order += self.LINK_ORDER_GAP
+            it = it._link_next
+
     @property
     def next(self):
         return self._link_next
@@ -216,45 +287,76 @@ class LinkedListNodeMixin(NodeMixin):
     def prev(self):
         return self._link_prev
 
+    # first and last link of the children of this node,
+    # maintained by the attach/detach hooks and the insert methods
     @property
-    def first_link(self):
-        it = self._link_prev
+    def _link_head(self):
+        try:
+            return self.__link_head
+        except AttributeError:
+            return None
 
-        if it is None:
-            return self
+    @_link_head.setter
+    def _link_head(self, value):
+        self.__link_head = value
 
-        while not it._link_prev is None:
-            assert it != it._link_prev
-            it = it._link_prev
+    @property
+    def _link_tail(self):
+        try:
+            return self.__link_tail
+        except AttributeError:
+            return None
 
-        return it
+    @_link_tail.setter
+    def _link_tail(self, value):
+        self.__link_tail = value
 
     @property
-    def last_link(self):
-        it = self._link_next
-
-        if it is None:
+    def first_link(self):
+        if self.parent is None:
             return self
 
-        while not it._link_next is None:
-            assert it != it._link_next
-            it = it._link_next
+        return self.parent._link_head
+
+    @property
+    def last_link(self):
+        if self.parent is None:
+            return self
 
-        return it
+        return self.parent._link_tail
 
     @property
     def first_link_child(self):
-        if len(self.children) == 0:
-            return None
-
-        return self.children[0].first_link
+        return self._link_head
 
     @property
     def last_link_child(self):
-        if len(self.children) == 0:
-            return None
+        return self._link_tail
+
+    # appends the detached nodes in `children` to the children of this node
+    # in one step, without running the attach hooks. the labels of the
+    # appended subtrees have to be updated by the caller
+    def _link_children(self, children):
+        if len(children) == 0:
+            return
 
-        return self.children[0].last_link
+        prev = self._link_tail
+        order = 0 if prev is None else prev._link_order + self.LINK_ORDER_GAP
+        for child in children:
+            child._LightNodeMixin__parent = self
+            child._link_prev = prev
+            child._link_order = order
+            if prev is None:
+                self._link_head = child
+            else:
+                prev._link_next = child
+
+            prev = child
+            order += self.LINK_ORDER_GAP
+
+        prev._link_next = None
+        self._link_tail = prev
+        self._LightNodeMixin__children_or_empty.extend(children)
 
     def insert_as_first_child(self, node):
         if self == node:
@@ -274,45 +376,207 @@ class LinkedListNodeMixin(NodeMixin):
         else:
             self.last_link_child.insert_after(node)
 
-    def remove_from_linked_list(self):
+    # parent defaults to the current parent, the detach hook
+    # passes the parent this node has just been detached from
+    def remove_from_linked_list(self, parent=None):
+        if parent is None:
+            parent = self.parent
+
         if not self._link_prev is None:
             self._link_prev._link_next = self._link_next
+        elif not parent is None:
+            parent._link_head = self._link_next
 
         if not self._link_next is None:
             self._link_next._link_prev = self._link_prev
+        elif not parent is None:
+            parent._link_tail = self._link_prev
+
+        self._link_prev = None
+        self._link_next = None
+
+    # nested interval labels: every node has an enter and an exit label and
+    # the labels of a tree are ordered like an euler tour along the linked
+    # children. so a node is an ancestor of another one if its labels enclose
+    # the labels of the other one. every node references the root of its
+    # tree, detached subtrees keep their labels, which are still nested.
+    @property
+    def _label_enter(self):
+        try:
+            return self.__label_enter
+        except AttributeError:
+            return 0
+
+    @_label_enter.setter
+    def _label_enter(self, value):
+        self.__label_enter = value
 
     @property
-    def _block_hooks(self):
+    def _label_exit(self):
         try:
-            return self.__block_hooks
+            return self.__label_exit
         except AttributeError:
+            return self.LABEL_GAP
+
+    @_label_exit.setter
+    def _label_exit(self, value):
+        self.__label_exit = value
+
+    @property
+    def _label_root(self):
+        try:
+            return self.__label_root
+        except AttributeError:
+            return self
+
+    @_label_root.setter
+    def _label_root(self, value):
+        self.__label_root = value
+
+    # only used on root nodes, set if there was no gap left for new labels
+    @property
+    def _labels_outdated(self):
+        try:
+            return self.__labels_outdated
+        except AttributeError:
+            return False
+
+    @_labels_outdated.setter
+    def _labels_outdated(self, value):
+        self.__labels_outdated = value
+
+    @property
+    def root(self):
+        return self._label_root
+
+    @property
+    def label_range(self):
+        root = self._label_root
+        if root._labels_outdated:
+            root._renumber_labels()
+
+        return (self._label_enter, self._label_exit)
+
+    def is_ancestor_of(self, node):
+        root = self._label_root
+        if not node._label_root is root:
             return False
 
-    @_block_hooks.setter
-    def _block_hooks(self, value):
-        self.__block_hooks = value
+        if root._labels_outdated:
+            root._renumber_labels()
+
+        return self._label_enter < node._label_enter and node._label_exit < self._label_exit
+
+    def is_descendant_of(self, node):
+        return node.is_ancestor_of(self)
+
+    # nodes of this subtree in euler tour order, every node
+    # is contained twice: entering it and leaving it
+    def _euler_tour(self):
+        tour = []
+        node = self
+        while True:
+            tour.append(node)
+            if not node._link_head is None:
+                node = node._link_head
+                continue
+
+            tour.append(node)
+            while not node is self and node._link_next is None:
+                node = node.parent
+                tour.append(node)
+
+            if node is self:
+                return tour
+            node = node._link_next
+
+    @staticmethod
+    def _set_tour_labels(tour, start, step):
+        entered = set()
+        label = start
+        for node in tour:
+            label += step
+            if node in entered:
+                node._label_exit = label
+            else:
+                node._label_enter = label
+                entered.add(node)
+
+    # labels this subtree at its position in the linked list, taking the
+    # labels between the neighbouring labels. the whole tree is renumbered
+    # on the next query if there is no gap left
+    def _update_labels(self):
+        parent = self.parent
+        tour = self._euler_tour()
+
+        if parent is None:
+            if self._label_root._labels_outdated:
+                self._labels_outdated = True
+            root = self
+        else:
+            root = parent._label_root
 
+        for node in tour:
+            node._label_root = root
 
-    def _post_detach(self, parent):
-        if self._block_hooks:
+        if parent is None or root._labels_outdated:
             return
-        self.remove_from_linked_list()
+
+        if self._link_prev is None:
+            lower = parent._label_enter
+        else:
+            lower = self._link_prev._label_exit
+
+        if self._link_next is None:
+            upper = parent._label_exit
+        else:
+            upper = self._link_next._label_enter
+
+        step = (upper - lower) // (len(tour) + 1)
+        if step == 0:
+            root._labels_outdated = True
+        else:
+            self._set_tour_labels(tour, lower, step)
+
+    def _renumber_labels(self):
+        self._set_tour_labels(self._euler_tour(), 0, self.LABEL_GAP)
+        self._labels_outdated = False
+
+    # called after this node was moved with insert_before/insert_after
+    def _post_reorder(self):
+        pass
+
+    def _post_detach(self, parent):
+        self.remove_from_linked_list(parent)
+        self._update_labels()
+
+    def _post_attach(self, parent):
+        self._update_labels()
 
     def _pre_attach(self, parent):
-        if self._block_hooks:
-            return
+        tail = parent.last_link_child
 
         self._link_next = None
-        if not parent.last_link_child is None:
-            self._link_prev = parent.last_link_child
-            parent.last_link_child._link_next = self
+        self._link_prev = tail
+        if tail is None:
+            parent._link_head = self
+        else:
+            tail._link_next = self
+        parent._link_tail = self
+        self._update_link_order()
             
 
 class AnyOrderedNode(AnyNode, OrderedNodeMixin):
     pass
 
-class AnyLinkedListNode(AnyNode, LinkedListNodeMixin):
-    pass
+# counterpart of anytree's AnyNode, which is based on NodeMixin
+# and can not be mixed with nodes based on LightNodeMixin
+class AnyLinkedListNode(LinkedListNodeMixin):
+    def __init__(self, parent=None, children=None, **kwargs):
+        self.__dict__.update(kwargs)
+        self.parent = parent
+        if children:
+            self.children = children
 
 class AnyTaskTreeAwareNode(AnyLinkedListNode):
     def __init__(self, tasktree):
@@ -0,0 +1,753 @@
+from itertools import islice, count
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from .events import TaskChange
+from .config import Config
+from .timing import timings
+
+# generation stamps of the row sequences. a sequence gets a new stamp on
+# every change, so a stamp identifies one state of one sequence
+_generations = count()
+
+# a list that finds the positions of its items through a map, which is
+# built on first use. only item assignment, deletion (including slices) and
+# sort keep the map and the generation stamp up to date, other changes in
+# place are not supported.
+class IndexedList(list):
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._changed()
+
+    def _changed(self):
+        self.generation = next(_generations)
+        self._positions = None
+
+    def _position_map(self):
+        if self._positions is None:
+            self._positions = {item : i for i, item in enumerate(self)}
+
+        return self._positions
+
+    def index(self, item):
+        try:
+            return self._position_map()[item]
+        except KeyError:
+            raise ValueError("{} is not in list".format(item))
+
+    def __contains__(self, item):
+        return item in self._position_map()
+
+    def __setitem__(self, i, value):
+        super().__setitem__(i, value)
+        self._changed()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+# the numbers of rows of a sibling group in the order of the rows, as a
+# Fenwick tree, so the rows before a child and the child holding a row are
+# found in O(log n) steps. children whose number of rows changed are marked
+# dirty and updated on the next use of the group
+class _PrefixCounts:
+    __slots__ = ('children', 'position', 'values', 'tree', 'total', 'dirty')
+
+    def __init__(self, children, values):
+        self.children = children
+        self.position = {c : i for i, c in enumerate(children)}
+        self.values = list(values)
+        self.total = sum(self.values)
+        self.dirty = set()
+
+        tree = [0] + self.values
+        n = len(tree)
+        for i in range(1, n):
+            j = i + (i & -i)
+            if j < n:
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def set(self, i, value):
+        delta = value - self.values[i]
+        if delta == 0:
+            return
+
+        self.values[i] = value
+        self.total += delta
+
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    # number of rows of the children before child i
+    def prefix(self, i):
+        tree = self.tree
+        s = 0
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+
+        return s
+
+    # the position of the child holding row `start` of the group and
+    # the index of that row in the rows of the child
+    def find(self, start):
+        tree = self.tree
+        i = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step != 0:
+            j = i + step
+            if j < len(tree) and tree[j] <= start:
+                start -= tree[j]
+                i = j
+            step >>= 1
+
+        return i, start
+
+# the rows of the tree list of a TaskTree, computed on demand instead of
+# materializing the whole list. every task caches the number of rows of its
+# shown subtree and every expanded task the prefix sums of these numbers
+# over its children, so the row at an index and the index of a task are
+# found by descending the tree in O(depth * log(siblings)). the counts are
+# computed on first use and dropped along the path of a changed task, the
+# prefix sums are updated for the dropped counts and rebuilt only when the
+# order of the children changes. iterating from the top needs no counts.
+# the rows follow the sorted views of the tree, like TaskTree._visible_tasks.
+class TaskRows:
+    # fields the counts depend on
+    FIELDS = ('state', 'categories', 'collapsed')
+
+    def __init__(self, tree):
+        self._tree = tree
+        self._counts = {}
+        self._prefix = {}
+        self._visible = {}
+        self.generation = next(_generations)
+
+    def outdate(self):
+        self._counts = {}
+        self._prefix = {}
+        self._visible = {}
+        self.generation = next(_generations)
+
+    def _children(self, task):
+        return self._tree._sorter.children(task)
+
+    # number of rows of `task` and its shown descendants,
+    # for the root the number of all rows
+    def _count(self, task):
+        counts = self._counts
+        try:
+            return counts[task]
+        except KeyError:
+            pass
+
+        root = self._tree.root
+        stack = [(task, False)]
+        while len(stack) != 0:
+            node, counted_children = stack.pop()
+
+            if counted_children:
+                counts[node] = (0 if node is root else 1) + self._prefix_counts(node).total
+            elif node is root or node._show_self and not node.collapsed:
+                stack.append((node, True))
+                prefix = self._prefix.get(node)
+                children = node._child_list if prefix is None else prefix.dirty
+                stack.extend((c, False) for c in children if not c in counts)
+            else:
+                counts[node] = 1 if node._show_self else 0
+
+        return counts[task]
+
+    # the prefix sums of the counts of the children of `parent`
+    def _prefix_counts(self, parent):
+        prefix = self._prefix.get(parent)
+        if prefix is None:
+            children = self._children(parent)
+            prefix = _PrefixCounts(children, [self._count(c) for c in children])
+            self._prefix[parent] = prefix
+        elif len(prefix.dirty) != 0:
+            for c in prefix.dirty:
+                prefix.set(prefix.position[c], self._count(c))
+            prefix.dirty.clear()
+
+        return prefix
+
+    # number of rows of the shown task `task` and its shown descendants
+    def subtree_rows(self, task):
+        return self._count(task)
+
+    def __len__(self):
+        return self._count(self._tree.root)
+
+    def __contains__(self, task):
+        if task is None or task is self._tree.root:
+            return False
+
+        return task in self._tree and task.show
+
+    def __iter__(self):
+        return self._iter_from(0)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start = 0 if i.start is None else i.start
+            if i.step in (None, 1) and start >= 0 and not i.stop is None and i.stop >= 0:
+                # rows of the viewport, without counting all rows
+                return list(islice(self._iter_from(start), max(0, i.stop - start)))
+
+            return list(self)[i]
+
+        if i < 0:
+            i += len(self)
+        if i < 0:
+            raise IndexError("row index out of range")
+
+        for task in self._iter_from(i):
+            return task
+
+        raise IndexError("row index out of range")
+
+    def index(self, task):
+        if not task in self:
+            raise ValueError("task is not shown in the tree")
+
+        index = 0
+        for node in task.iter_path_reverse():
+            if node is self._tree.root:
+                break
+            if not node is task:
+                # the row of the ancestor itself
+                index += 1
+
+            prefix = self._prefix_counts(node.parent)
+            index += prefix.prefix(prefix.position[node])
+
+        return index
+
+    # the shown children of `parent` in the order of the rows, as an
+    # IndexedList. these are rows if `parent` is shown and expanded.
+    # the list must not be modified
+    def visible_children(self, parent):
+        try:
+            return self._visible[parent]
+        except KeyError:
+            children = IndexedList(c for c in self._children(parent) if c._show_self)
+            self._visible[parent] = children
+            return children
+
+    # rows from index `start` on, in pre-order. the iterators over
+    # the remaining siblings on the path to the first row are kept
+    # on a stack and continued after the subtree of that row
+    def _iter_from(self, start):
+        task = None
+        if start == 0:
+            stack = [iter(self._children(self._tree.root))]
+        else:
+            stack = []
+            parent = self._tree.root
+            while True:
+                prefix = self._prefix_counts(parent)
+                if start >= prefix.total:
+                    return
+
+                i, start = prefix.find(start)
+                children = prefix.children
+                stack.append(map(children.__getitem__, range(i + 1, len(children))))
+                task = children[i]
+
+                if start == 0:
+                    break
+
+                # the row of the task itself
+                start -= 1
+                parent = task
+
+        while True:
+            while len(stack) != 0 and task is None:
+                for t in stack[-1]:
+                    if t._show_self:
+                        task = t
+                        break
+                else:
+                    stack.pop()
+
+            if task is None:
+                return
+
+            yield task
+            if not task.collapsed:
+                stack.append(iter(self._children(task)))
+            task = None
+
+    # drops the counts along the path, the prefix sums of the parents
+    # are updated for them on their next use
+    def _drop_path(self, task):
+        for node in task.iter_path_reverse():
+            self._counts.pop(node, None)
+            prefix = self._prefix.get(node.parent)
+            if not prefix is None:
+                prefix.dirty.add(node)
+
+    def _drop_subtree(self, task):
+        stack = [task]
+        while len(stack) != 0:
+            node = stack.pop()
+            self._counts.pop(node, None)
+            self._prefix.pop(node, None)
+            self._visible.pop(node, None)
+            stack.extend(node._child_list)
+
+    # the children of `parent` changed their order
+    def _drop_order(self, parent):
+        self._prefix.pop(parent, None)
+        self._visible.pop(parent, None)
+
+    # with a show only filter the categories of a task may show or hide
+    # its ancestors, so the shown children are dropped along the path
+    def _drop_visible_path(self, task):
+        if len(self._tree.show_only_categories) == 0:
+            return
+
+        for node in task.iter_path_reverse():
+            self._visible.pop(node, None)
+
+    def on_task_change(self, event):
+        task = event.task
+
+        if event.change == TaskChange.FIELD:
+            shown = event.field in self.FIELDS
+            if not shown and not self._tree._sorter.orders_by(event.field):
+                # neither shows, hides nor moves rows
+                return
+
+            self.generation = next(_generations)
+            if self._tree._sorter.orders_by(event.field):
+                self._drop_order(task.parent)
+            else:
+                self._visible.pop(task.parent, None)
+            if not shown:
+                return
+
+            if event.field == 'categories':
+                # inherited categories may hide or show the descendants
+                self._drop_subtree(task)
+                self._drop_visible_path(task)
+            self._drop_path(task)
+        elif event.change == TaskChange.ORDER:
+            self.generation = next(_generations)
+            self._drop_order(task.parent)
+        elif event.change == TaskChange.ATTACHED:
+            self.generation = next(_generations)
+            self._drop_subtree(task)
+            self._drop_order(task.parent)
+            self._drop_path(task.parent)
+            self._drop_visible_path(task)
+        elif event.change == TaskChange.DETACHED:
+            self.generation = next(_generations)
+            self._drop_subtree(task)
+            self._drop_order(event.parent)
+            self._drop_path(event.parent)
+            self._drop_visible_path(event.parent)
+
+# the tasks shown on the schedule of a TaskTree, see Task.show_on_schedule,
+# sorted by date and priority. the list is built on first use from the
+# tasks given by TaskTree._schedule_tasks and then kept sorted by inserting
+# and removing the tasks whose schedule fields change. every task keeps the
+# key it was inserted with, the last component of the key keeps equal tasks
+# in the order they were inserted in.
+class ScheduleIndex:
+    # fields the schedule depends on, categories only if the schedule is
+    # filtered by categories
+    FIELDS = ('due', 'scheduled', 'state', 'priority', 'categories')
+
+    def __init__(self, tree):
+        self._tree = tree
+        # a plain counter, as the index is deep copied with its tree
+        self._sequence = 0
+        self.outdate()
+
+    def outdate(self):
+        self._tasks = None
+        self._keys = None
+        self._key_of = None
+        self.generation = next(_generations)
+
+    def _make_key(self, task, sequence=None):
+        if sequence is None:
+            sequence = self._sequence
+            self._sequence += 1
+
+        return self.sort_key(task) + (sequence,)
+
+    def _build(self):
+        if not self._tasks is None:
+            return
+
+        self._tasks = list(self._tree._schedule_tasks())
+        self._keys = [self._make_key(t) for t in self._tasks]
+        self._key_of = dict(zip(self._tasks, self._keys))
+
+    def _remove(self, task):
+        key = self._key_of.pop(task, None)
+        if key is None:
+            return None
+
+        index = bisect_left(self._keys, key)
+        del self._keys[index]
+        del self._tasks[index]
+        return key
+
+    def _update(self, task):
+        if task is self._tree.root:
+            return
+
+        key = self._remove(task)
+        if not task.show_on_schedule:
+            return
+
+        key = self._make_key(task, None if key is None else key[2])
+        index = bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self._tasks.insert(index, task)
+        self._key_of[task] = key
+
+    def _update_path(self, task):
+        for node in task.iter_path_reverse():
+            self._update(node)
+
+    def _update_subtree(self, task, remove=False):
+        stack = [task]
+        while len(stack) != 0:
+            node = stack.pop()
+            if remove:
+                self._remove(node)
+            else:
+                self._update(node)
+            stack.extend(node.children)
+
+    def __len__(self):
+        self._build()
+        return len(self._tasks)
+
+    def __contains__(self, task):
+        self._build()
+        return task in self._key_of
+
+    def __iter__(self):
+        self._build()
+        return iter(self._tasks)
+
+    def __getitem__(self, i):
+        self._build()
+        return self._tasks[i]
+
+    def index(self, task):
+        self._build()
+        try:
+            return bisect_left(self._keys, self._key_of[task])
+        except KeyError:
+            raise ValueError("task is not on the schedule")
+
+    # the key of `task` without the sequence number, see sort_key
+    def sort_key_of(self, task):
+        self._build()
+        return self._key_of[task][:2]
+
+    # number of tasks before the tasks with the sort key `key`,
+    # or up to them if after is set
+    def count_before(self, key, after=False):
+        self._build()
+        if after:
+            return bisect_right(self._keys, key + (float('inf'),))
+        else:
+            return bisect_left(self._keys, key)
+
+    # the order of the schedule without the sequence number
+    @staticmethod
+    def sort_key(task):
+        priority = 0 if task.priority is None else task.priority
+        return (task.sort_date, -priority)
+
+    def on_task_change(self, event):
+        if self._tasks is None:
+            return
+
+        filtered = Config.get("behaviour.filter_categories_schedule")
+        if event.change == TaskChange.FIELD and event.field == 'categories' and not filtered:
+            return
+
+        self.generation = next(_generations)
+        task = event.task
+
+        if event.change == TaskChange.FIELD:
+            if event.field == 'categories':
+                # the categories are inherited by the descendants and
+                # shown-only categories show the ancestors
+                self._update_subtree(task)
+                self._update_path(task)
+            else:
+                self._update(task)
+        elif event.change == TaskChange.ATTACHED:
+            self._update_subtree(task)
+            if filtered:
+                self._update_path(task)
+        elif event.change == TaskChange.DETACHED:
+            self._update_subtree(task, remove=True)
+            if filtered:
+                self._update_path(event.parent)
+
+# inverts the order of a key, for the reversed sort orders
+class _Descending:
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+# the rows of the flat tree of a TaskTree in any order but the natural one,
+# which are the shown tasks sorted as a whole by the keys of the sorter, see
+# TaskTreeSorter. the rows are built on first use from TaskTree._flat_tasks
+# and then kept sorted like the ScheduleIndex, by removing and inserting the
+# tasks whose visibility or key changes. equal tasks stay in the order they
+# were inserted in.
+class FlatRows:
+    # fields the rows depend on, see TaskTreeSorter.FIELDS
+    FIELDS = ('title', 'categories', 'due', 'scheduled', 'priority', 'state', 'collapsed')
+
+    def __init__(self, tree):
+        self._tree = tree
+        self._sequence = 0
+        self.outdate()
+
+    def outdate(self):
+        self._tasks = None
+        self._keys = None
+        self._key_of = None
+        self.generation = next(_generations)
+
+    def _make_key(self, task, sequence=None):
+        if sequence is None:
+            sequence = self._sequence
+            self._sequence += 1
+
+        key = self._key(task)
+        if self._reverse:
+            key = _Descending(key)
+
+        return (key, sequence)
+
+    def _build(self):
+        if not self._tasks is None:
+            return
+
+        # the order is kept until the rows are outdated
+        sorter = self._tree._sorter
+        self._key = sorter._key_function()
+        self._reverse = sorter.order[1]
+
+        tasks = self._tree._flat_tasks()
+        keys = [self._make_key(t) for t in tasks]
+        self._key_of = dict(zip(tasks, keys))
+        self._tasks = sorted(tasks, key=self._key_of.__getitem__)
+        self._keys = sorted(keys)
+
+    def _remove(self, task):
+        key = self._key_of.pop(task, None)
+        if key is None:
+            return None
+
+        index = bisect_left(self._keys, key)
+        del self._keys[index]
+        del self._tasks[index]
+        return key
+
+    def _update(self, task, shown):
+        if task is self._tree.root:
+            return
+
+        key = self._key_of.get(task)
+        if shown and not key is None and self._make_key(task, key[1]) == key:
+            return
+
+        self._remove(task)
+        if not shown:
+            return
+
+        key = self._make_key(task, None if key is None else key[1])
+        index = bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self._tasks.insert(index, task)
+        self._key_of[task] = key
+
+    # updates `task` and its descendants, which are hidden with it. subtrees
+    # that were hidden and stay hidden are not visited
+    def _update_subtree(self, task, remove=False):
+        stack = [(task, not remove and task in self._tree and task.show)]
+        while len(stack) != 0:
+            node, shown = stack.pop()
+            if not shown and not node in self._key_of:
+                continue
+
+            self._update(node, shown)
+
+            shown = shown and not node.collapsed
+            stack.extend((c, shown and c._show_self) for c in node.children)
+
+    # shown-only categories show the ancestors of the tasks having them
+    def _update_path(self, task):
+        for node in task.iter_path_reverse():
+            if node is self._tree.root:
+                return
+            self._update(node, node.show)
+
+    def __len__(self):
+        self._build()
+        return len(self._tasks)
+
+    def __contains__(self, task):
+        self._build()
+        return task in self._key_of
+
+    def __iter__(self):
+        self._build()
+        return iter(self._tasks)
+
+    def __getitem__(self, i):
+        self._build()
+        return self._tasks[i]
+
+    def index(self, task):
+        self._build()
+        try:
+            return bisect_left(self._keys, self._key_of[task])
+        except KeyError:
+            raise ValueError("task is not shown in the tree")
+
+    def on_task_change(self, event):
+        if self._tasks is None:
+            return
+
+        self.generation = next(_generations)
+        task = event.task
+        show_only = len(self._tree.show_only_categories) != 0
+
+        if event.change == TaskChange.FIELD:
+            if event.field in ('state', 'categories', 'collapsed'):
+                self._update_subtree(task)
+                if event.field == 'categories' and show_only:
+                    self._update_path(task.parent)
+            else:
+                self._update(task, task in self._key_of)
+        elif event.change == TaskChange.ATTACHED:
+            self._update_subtree(task)
+            if show_only:
+                self._update_path(task.parent)
+        elif event.change == TaskChange.DETACHED:
+            self._update_subtree(task, remove=True)
+            if show_only:
+                self._update_path(event.parent)
+
+# the schedules of several trees merged into one, as for the global
+# schedule of a TreeManager. equal tasks are ordered by the order of the
+# trees. the merged tasks are computed on demand from the start and kept
+# until the schedule of one of the trees or the list of trees changes.
+class MergedSchedule:
+    def __init__(self, trees):
+        # a callable returning the trees
+        self._trees = trees
+        self._stamp = None
+        self._generation = None
+
+    # the merge in progress can not be copied, the copy merges again
+    # on first use. tasks are copied with their tree before modifications
+    def __deepcopy__(self, memo):
+        return MergedSchedule(self._trees)
+
+    def _schedules(self):
+        return [t.schedule_list for t in self._trees()]
+
+    def _check(self):
+        schedules = self._schedules()
+        stamp = tuple((id(s), s.generation) for s in schedules)
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._generation = next(_generations)
+            self._merged = []
+            self._merge = merge(*schedules, key=ScheduleIndex.sort_key)
+
+        return schedules
+
+    # merges the tasks up to index `stop`, or all if it is None
+    @timings.timed("global_schedule")
+    def _merge_until(self, stop=None):
+        self._check()
+        if stop is None:
+            self._merged.extend(self._merge)
+        elif stop > len(self._merged):
+            self._merged.extend(islice(self._merge, stop - len(self._merged)))
+
+        return self._merged
+
+    @property
+    def generation(self):
+        self._check()
+        return self._generation
+
+    # see ScheduleIndex.count_before
+    def count_before(self, key, after=False):
+        return sum(s.count_before(key, after) for s in self._check())
+
+    def __len__(self):
+        return sum(len(s) for s in self._check())
+
+    def __contains__(self, task):
+        return any(task in s for s in self._check())
+
+    def __iter__(self):
+        return iter(self._merge_until())
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if i.step in (None, 1) and not i.stop is None and i.stop >= 0 and (i.start is None or i.start >= 0):
+                return self._merge_until(i.stop)[i]
+
+            return self._merge_until()[i]
+
+        if i < 0:
+            return self._merge_until()[i]
+
+        merged = self._merge_until(i + 1)
+        if i >= len(merged):
+            raise IndexError("schedule index out of range")
+
+        return merged[i]
+
+    # the tasks of the schedules before `task` are counted by bisection,
+    # including equal tasks of the preceding trees
+    def index(self, task):
+        schedules = self._check()
+        for j, schedule in enumerate(schedules):
+            if task in schedule:
+                break
+        else:
+            raise ValueError("task is not on the schedule")
+
+        key = schedule.sort_key_of(task)
+        index = schedule.index(task)
+        for k, other in enumerate(schedules):
+            if k != j:
+                index += other.count_before(key, after=k < j)
+
+        return index
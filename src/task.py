@@ -1,9 +1,9 @@
 from .node import LinkedListNodeMixin, AnyLinkedListNode, AnyTaskTreeAwareNode
 import logging
 from .config import Config
+from .events import TaskChange, TaskEvent
 from enum import Enum
 from datetime import date
-from anytree import AnyNode
 
 
 class TaskState(Enum):
@@ -12,30 +12,93 @@ class TaskState(Enum):
     CANCELLED = 2
 
 class Task(LinkedListNodeMixin):
+    # fixed attribute storage instead of a per-instance __dict__,
+    # the views are set by the TaskView subclasses in taskview.py
+    __slots__ = ("_title", "_categories", "_priority", "_text", "_state",
+                 "_due", "_scheduled", "_collapsed", "_descendant_states",
+                 "_descendant_categories", "_inherited_categories",
+                 "_version", "listview", "descriptionview", "scheduleview")
+
     def __init__(self, title, parent=None, children=None, **kwargs):
+        # categories are stored as tuple, all tasks without
+        # categories share the empty tuple
+        self._categories = ()
+        self._priority = None
+        self._text = ""
+        self._state = TaskState.PENDING
+        self._due = None
+        self._scheduled = None
+        self._collapsed = False
+        self._descendant_states = (0, 0, 0)
+        self._descendant_categories = None
+        self._inherited_categories = None
+        self._version = 0
+
         self.title = title
         self.parent = parent
         if children:
             self.children = children
 
-        self._fields = {
-                'categories' : [],
-                'priority' : None,
-                'text' : "",
-                'state' : TaskState.PENDING,
-                'due' : None,
-                'scheduled' : None,
-                'collapsed' : False
-        }
+    # creates a detached task from a record without publishing
+    # a change for every field. records are dicts with the
+    # keys title, text, priority, state, due, scheduled, collapsed and
+    # categories, all but title are optional
+    @classmethod
+    def from_record(cls, record):
+        task = cls.__new__(cls)
+        task._title = record['title']
+
+        categories = record.get('categories', ())
+        for c in categories:
+            if not type(c) == str:
+                raise ValueError("Categories must be of type str")
+        task._categories = tuple(dict.fromkeys(categories))
+
+        priority = record.get('priority')
+        task._priority = None if priority is None else int(priority)
+        task._text = str(record.get('text', ""))
+
+        state = record.get('state', TaskState.PENDING)
+        if not type(state) == TaskState:
+            raise ValueError("State not of enum class type TaskState")
+        task._state = state
+
+        for field in ('due', 'scheduled'):
+            value = record.get(field)
+            if not value is None and not type(value) == date:
+                raise ValueError("Date is not of type date")
+            setattr(task, '_' + field, value)
+
+        collapsed = record.get('collapsed', False)
+        if not type(collapsed) == bool:
+            raise ValueError("Collapsed must be set to a boolean value")
+        task._collapsed = collapsed
+        task._descendant_states = (0, 0, 0)
+        task._descendant_categories = None
+        task._inherited_categories = None
+        task._version = 0
+
+        return task
 
     def __str__(self):
         return "Task '{}', {}, prio {}, due {}, sched {}, {}collapsed, categories: {}, text: '{}'".format(
                 self.title, self.state, self.priority, self.due, self.scheduled,
                 'not ' if self.collapsed is False else '', self.categories, self.text)
 
-    def _modification_hook(self):
-        if isinstance(self.root, AnyTaskTreeAwareNode):
-            self.root.tasktree.outdate_tree_list()
+    # publishes a change of this task to the tree it is in. for
+    # DETACHED changes, that is the tree of the former parent
+    def _publish(self, change, field=None, parent=None):
+        self._version += 1
+        root = self.root if parent is None else parent.root
+
+        if isinstance(root, AnyTaskTreeAwareNode):
+            root.tasktree.events.publish(TaskEvent(change, self, field, parent))
+
+    # number of changes of this task, see _publish. changes of
+    # descendants, like of the progress, are not counted
+    @property
+    def version(self):
+        return self._version
 
     @property
     def title(self):
@@ -44,81 +107,160 @@ class Task(LinkedListNodeMixin):
     @title.setter
     def title(self, value):
         self._title = value
-        self._modification_hook()
+        self._publish(TaskChange.FIELD, "title")
 
     @property
     def categories(self):
-        return tuple(self._fields['categories'])
+        return self._categories
 
     @categories.setter
     def categories(self, value):
+        old = self._categories
         if value is None:
-            self._fields['categories'] = []
+            self._categories = ()
         else:
-            self._fields['categories'] = list(value)
-        self._modification_hook()
+            self._categories = tuple(value)
+        self._categories_changed(old)
+        self._publish(TaskChange.FIELD, "categories")
+
+    # _descendant_categories counts how many descendants have each category,
+    # it is None if no descendant has a category. _inherited_categories
+    # caches inherited_categories and is None if it is outdated; if it is
+    # None, it is None for all descendants too.
+    def _categories_changed(self, old):
+        old = set(old)
+        new = set(self._categories)
+        if old == new:
+            return
+
+        self._propagate_categories(self.parent, dict.fromkeys(old - new, 1), dict.fromkeys(new - old, 1))
+        for child in self.children:
+            child._outdate_inherited_categories()
+
+    # removes the category counts `removed` from and adds `added`
+    # to the descendant categories of `parent` and its ancestors
+    @staticmethod
+    def _propagate_categories(parent, removed, added):
+        if len(removed) == 0 and len(added) == 0:
+            return
+
+        while isinstance(parent, Task):
+            counts = parent._descendant_categories
+            if counts is None:
+                counts = {}
 
+            for c, n in added.items():
+                counts[c] = counts.get(c, 0) + n
+
+            for c, n in removed.items():
+                counts[c] -= n
+                if counts[c] == 0:
+                    del counts[c]
+
+            parent._descendant_categories = counts if len(counts) != 0 else None
+            parent = parent.parent
+
+    # category counts of this task and its descendants
     @property
-    def inherited_categories(self):
-        if self.parent.is_root:
-            return tuple()
+    def _subtree_categories(self):
+        counts = {} if self._descendant_categories is None else dict(self._descendant_categories)
+        for c in set(self._categories):
+            counts[c] = counts.get(c, 0) + 1
+
+        return counts
+
+    # counts the descendant categories of a task whose children
+    # were linked without running the attach hooks
+    def _count_descendant_categories(self):
+        counts = {}
+        for child in self.children:
+            for c, n in child._subtree_categories.items():
+                counts[c] = counts.get(c, 0) + n
+
+        self._descendant_categories = counts if len(counts) != 0 else None
+
+    def _outdate_inherited_categories(self):
+        stack = [self]
+        while len(stack) != 0:
+            task = stack.pop()
+            if task._inherited_categories is None:
+                continue
 
-        return tuple(set(self.parent.categories) | set(self.parent.inherited_categories))
+            task._inherited_categories = None
+            stack.extend(task.children)
+
+    @property
+    def inherited_categories(self):
+        if self._inherited_categories is None:
+            parent = self.parent
+            if parent is None or parent.is_root:
+                if isinstance(parent, Task):
+                    # fill the cache of a detached parent too, see above
+                    parent.inherited_categories
+                self._inherited_categories = ()
+            else:
+                self._inherited_categories = tuple(dict.fromkeys(parent.inherited_categories + parent.categories))
+
+        return self._inherited_categories
 
     @property
     def descendants_categories(self):
-        cset = set()
-        for c in self.children:
-            cset |= set(c.categories)
-            cset |= set(c.descendants_categories)
+        if self._descendant_categories is None:
+            return ()
 
-        return tuple(cset)
+        return tuple(self._descendant_categories)
 
     def add_category(self, category):
         if not type(category) == str:
             raise ValueError("Categories must be of type str")
 
         if not category in self.categories: 
-            self._fields['categories'].append(category)
-        self._modification_hook()
+            old = self._categories
+            self._categories += (category,)
+            self._categories_changed(old)
+        self._publish(TaskChange.FIELD, "categories")
 
     def remove_category(self, category):
         if category in self.categories:
-            self._fields['categories'].remove(category)
-        self._modification_hook()
+            old = self._categories
+            self._categories = tuple(c for c in self._categories if c != category)
+            self._categories_changed(old)
+        self._publish(TaskChange.FIELD, "categories")
 
     @property
     def priority(self):
-        return self._fields['priority']
+        return self._priority
 
     @priority.setter
     def priority(self, value):
         if value is None:
-            self._fields['priority'] = None
+            self._priority = None
         else:
-            self._fields['priority'] = int(value)
-        self._modification_hook()
+            self._priority = int(value)
+        self._publish(TaskChange.FIELD, "priority")
 
     @property
     def text(self):
-        return self._fields['text']
+        return self._text
     
     @text.setter
     def text(self, value):
-        self._fields['text'] = str(value)
-        self._modification_hook()
+        self._text = str(value)
+        self._publish(TaskChange.FIELD, "text")
 
     @property
     def state(self):
-        return self._fields['state']
+        return self._state
 
     @state.setter
     def state(self, value):
         if not type(value) == type(TaskState.PENDING):
             raise ValueError("State not of enum class type TaskState")
 
-        self._fields['state'] = value
-        self._modification_hook()
+        old = self._progress_contribution
+        self._state = value
+        self._propagate_progress(self.parent, old, self._progress_contribution)
+        self._publish(TaskChange.FIELD, "state")
 
     def toggle_done(self):
         if self.state == TaskState.PENDING:
@@ -138,35 +280,27 @@ class Task(LinkedListNodeMixin):
 
     @property
     def scheduled(self):
-        return self._fields['scheduled']
+        return self._scheduled
 
     @scheduled.setter
     def scheduled(self, value):
-        if value is None:
-            self._fields['scheduled'] = None
-            return
-
-        if not type(value) == date:
+        if not value is None and not type(value) == date:
             raise ValueError("Date is not of type date")
         
-        self._fields['scheduled'] = value
-        self._modification_hook()
+        self._scheduled = value
+        self._publish(TaskChange.FIELD, "scheduled")
 
     @property
     def due(self):
-        return self._fields['due']
+        return self._due
 
     @due.setter
     def due(self, value):
-        if value is None:
-            self._fields['due'] = None
-            return
-
-        if not type(value) == date:
+        if not value is None and not type(value) == date:
             raise ValueError("Date is not of type date")
         
-        self._fields['due'] = value
-        self._modification_hook()
+        self._due = value
+        self._publish(TaskChange.FIELD, "due")
 
     @property
     def sort_date(self):
@@ -180,15 +314,15 @@ class Task(LinkedListNodeMixin):
 
     @property
     def collapsed(self):
-        return self._fields['collapsed']
+        return self._collapsed
 
     @collapsed.setter
     def collapsed(self, value):
         if not type(value) == bool:
             raise ValueError("Collapsed must be set to a boolean value")
 
-        self._fields['collapsed'] = value
-        self._modification_hook()
+        self._collapsed = value
+        self._publish(TaskChange.FIELD, "collapsed")
 
     def toggle_collapse(self):
         self.collapsed = not self.collapsed
@@ -205,15 +339,19 @@ class Task(LinkedListNodeMixin):
     def _category_visible_by_showonly(self):
         assert type(self.root.tasktree.show_only_categories) is set
 
-        check_against = set(self.categories) | set(self.descendants_categories)
-        if Config.get("behaviour.inherit_categories_showonly"):
-            check_against |= set(self.inherited_categories)
-
         so_cat = self.root.tasktree.show_only_categories
 
         if not so_cat is None and len(so_cat) != 0:
-            intersection = so_cat & check_against
-            return len(intersection) != 0
+            if not so_cat.isdisjoint(self.categories):
+                return True
+
+            if not self._descendant_categories is None and not so_cat.isdisjoint(self._descendant_categories):
+                return True
+
+            if Config.get("behaviour.inherit_categories_showonly"):
+                return not so_cat.isdisjoint(self.inherited_categories)
+
+            return False
         else:
             return None
 
@@ -229,13 +367,10 @@ class Task(LinkedListNodeMixin):
 
         return self._category_visible_by_hidden
 
+    # visibility of this task by its own state and categories,
+    # not considering the ancestors
     @property
-    def show(self):
-        for ancestor in self.ancestors:
-            if not isinstance(ancestor, AnyNode):
-                if ancestor.collapsed or not ancestor.show:
-                    return False
-
+    def _show_self(self):
         if not Config.get("behaviour.show_done") and self.done:
             return False
 
@@ -244,6 +379,15 @@ class Task(LinkedListNodeMixin):
 
         return self._category_visible
 
+    @property
+    def show(self):
+        for ancestor in self.ancestors:
+            if not isinstance(ancestor, AnyTaskTreeAwareNode):
+                if ancestor.collapsed or not ancestor._show_self:
+                    return False
+
+        return self._show_self
+
     @property
     def show_on_schedule(self):
         if self.scheduled is None and self.due is None:
@@ -273,29 +417,105 @@ class Task(LinkedListNodeMixin):
     def pending(self):
         return self.state == TaskState.PENDING
 
+    # (done, cancelled) of the ancestors, not counting the root
+    @property
+    def _ancestors_state(self):
+        done = False
+        cancelled = False
+
+        ancestor = self.parent
+        while not ancestor is None and not ancestor.parent is None:
+            done = done or ancestor.done
+            cancelled = cancelled or ancestor.cancelled
+            ancestor = ancestor.parent
+
+        return done, cancelled
+
     @property
     def done_inherited(self):
-        if self.cancelled_inherited:
+        done, cancelled = self._ancestors_state
+        if self.cancelled or cancelled:
             # if it is cancelled by inheritance, it does not count as done by inheritance under any circumstances
             return False
 
-        return self.done or len([a for a in self.ancestors if not a.is_root and a.done]) > 0
+        return self.done or done
 
     @property
     def cancelled_inherited(self):
-        return self.cancelled or len([a for a in self.ancestors if not a.is_root and a.cancelled]) > 0
+        return self.cancelled or self._ancestors_state[1]
 
     @property
     def pending_inherited(self):
-        return self.pending and not self.done_inherited and not self.cancelled_inherited
+        done, cancelled = self._ancestors_state
+        return self.pending and not done and not cancelled
+
+    # _descendant_states holds the number of done, pending and cancelled
+    # descendants, inheriting the states of the ancestors up to this task.
+    # it is updated along the ancestors when a state changes or a subtree
+    # is attached or detached.
+    @property
+    def _progress_contribution(self):
+        d, p, c = self._descendant_states
+        if self.state == TaskState.DONE:
+            return (d + p + 1, 0, c)
+        elif self.state == TaskState.CANCELLED:
+            return (0, 0, d + p + c + 1)
+
+        return (d, p + 1, c)
+
+    # replaces the contribution `old` of a child of `parent` by `new`
+    @staticmethod
+    def _propagate_progress(parent, old, new):
+        while isinstance(parent, Task) and old != new:
+            before = parent._progress_contribution
+            parent._descendant_states = tuple(s - o + n for s, o, n in zip(parent._descendant_states, old, new))
+            old, new = before, parent._progress_contribution
+            parent = parent.parent
+
+    def _post_attach(self, parent):
+        super()._post_attach(parent)
+        self._propagate_progress(parent, (0, 0, 0), self._progress_contribution)
+        self._propagate_categories(parent, {}, self._subtree_categories)
+        self._outdate_inherited_categories()
+        self._publish(TaskChange.ATTACHED)
+
+    def _post_detach(self, parent):
+        super()._post_detach(parent)
+        self._propagate_progress(parent, self._progress_contribution, (0, 0, 0))
+        self._propagate_categories(parent, self._subtree_categories, {})
+        self._outdate_inherited_categories()
+        self._publish(TaskChange.DETACHED, parent=parent)
+
+    def _post_reorder(self):
+        self._publish(TaskChange.ORDER)
+
+    # counts the descendants of a task whose children were
+    # linked without running the attach hooks
+    def _count_descendant_states(self):
+        contributions = [c._progress_contribution for c in self.children]
+        self._descendant_states = tuple(sum(s) for s in zip((0, 0, 0), *contributions))
+
+    @property
+    def _inherited_descendant_states(self):
+        d, p, c = self._descendant_states
+        if self.parent is None:
+            # like the root, detached tasks pass no state to their descendants
+            return (d, p, c)
+
+        done, cancelled = self._ancestors_state
+        if self.cancelled or cancelled:
+            return (0, 0, d + p + c)
+        elif self.done or done:
+            return (d + p, 0, c)
 
+        return (d, p, c)
 
     def descendants_with(self, condition):
         return [c for c in self.descendants if condition(c)]
 
     @property
     def descendants_count(self):
-        return len(self.descendants)
+        return sum(self._descendant_states)
 
     @property
     def done_descendants_count(self):
@@ -311,20 +531,19 @@ class Task(LinkedListNodeMixin):
 
     @property
     def done_inherited_descendants_count(self):
-        return len(self.descendants_with(lambda c : c.done_inherited))
+        return self._inherited_descendant_states[0]
 
     @property
     def pending_inherited_descendants_count(self):
-        return len(self.descendants_with(lambda c : c.pending_inherited))
+        return self._inherited_descendant_states[1]
 
     @property
     def cancelled_inherited_descendants_count(self):
-        return len(self.descendants_with(lambda c : c.cancelled_inherited))
+        return self._inherited_descendant_states[2]
     
     @property
     def progress(self):
-        d = self.done_inherited_descendants_count
-        p = self.pending_inherited_descendants_count
+        d, p, c = self._inherited_descendant_states
         if d + p == 0:
             return 1 if self.done else 0
         return d / (d + p)
@@ -3,10 +3,9 @@ from math import ceil
 import logging
 import re
 from datetime import date, timedelta, datetime
-from anytree import AnyNode
+from .node import AnyTaskTreeAwareNode
 
 from .task import TaskState
-from .geometry import TaskWindowColumns, ScheduleCoordinates
 from .config import Config
 from .referenced import CallOnSet, ReferencedDescriptor
 
@@ -43,16 +42,27 @@ class EditableString:
     def __len__(self):
         return len(self.s)
 
-    def place(self, x, y, treetasks_app, maxcols=-1, maxlines=1):
+    # draws the string once at the given place, or only moves it there if
+    # draw is not set. attr is kept if not given
+    def place(self, x, y, treetasks_app, maxcols=-1, maxlines=1, attr=None, draw=True):
         self._noredraw = True
         self.app = treetasks_app
         self.x = x
         self.y = y
         self.maxcols = maxcols
         self.maxlines = maxlines
+        if not attr is None:
+            self.attr = attr
 
         self._noredraw = False
-        self._redraw()
+        if draw:
+            self._redraw()
+
+    # the first line of the string, as drawn if maxlines is 1
+    @property
+    def line(self):
+        lines = self.s.splitlines()
+        return lines[0] if len(lines) != 0 else ""
 
     def _redraw(self):
         # prevent multiple redrawings while __init__
@@ -113,6 +123,16 @@ class EditableDate(EditableString):
 
     @s.setter
     def s(self, value):
+        d = EditableDate.parse_date(value)
+
+        if d is None:
+            self.app.message = "Unable to parse date"
+        else:
+            self.descriptor.set(d)
+
+    # the date given by `s` in any of the supported notations or None
+    @staticmethod
+    def parse_date(s):
         parsers = [
             EditableDate.parse_date_name,
             EditableDate.parse_date_weekday,
@@ -121,14 +141,11 @@ class EditableDate(EditableString):
         ]
 
         for p in parsers:
-            d = p(value)
+            d = p(s)
             if not d is None:
-                break
+                return d
 
-        if d is None:
-            self.app.message = "Unable to parse date"
-        else:
-            self.descriptor.set(d)
+        return None
 
 
     @staticmethod
@@ -281,6 +298,25 @@ class EditableInt(EditableString):
         if self._validate(v):
             self.descriptor.set(v)
         
+# a key that is never equal to another one, for drawings that depend on
+# something outside of the tasks, like the time tracking of timewarrior
+def volatile_key():
+    if Config.get("plugins.timewarrior"):
+        return object()
+
+    return None
+
+# what a row of the tree is drawn from besides the size of the screen,
+# the configuration and the date: the task and its version, which does
+# not cover the progress and the children, its depth and the cursor.
+# in the flat tree, the path depends on the ancestors
+def list_row_key(task, app):
+    tree = app.tm.current
+    return (task.version, task.progress, len(task.children) == 0,
+            len(task.ancestors), task == tree.cursor,
+            tree.generation if Config.get("behaviour.flat_tree") else None,
+            volatile_key())
+
 class TaskView:
     x = CallOnSet("_redraw")
     y = CallOnSet("_redraw")
@@ -288,6 +324,9 @@ class TaskView:
     height = CallOnSet("_redraw")
     app = CallOnSet("_redraw")
 
+    # the attribute of the task referring to its view of this kind
+    view_attribute = None
+
     def __init__(self, task, geometry, treetasks_app):
         self._noredraw = True
 
@@ -298,6 +337,27 @@ class TaskView:
         self.height = geometry.h
         self.app = treetasks_app
 
+    # shows another task at another place, reusing the view and its
+    # editable strings instead of creating new ones. the view is
+    # drawn once after all changes
+    def bind(self, task, geometry):
+        self._noredraw = True
+
+        self.task = task
+        for editable in vars(self).values():
+            if isinstance(editable, EditableString):
+                editable.descriptor.instance = task
+
+        self.x = geometry.ul.x
+        self.y = geometry.ul.y
+        self.width = geometry.w
+        self.height = geometry.h
+
+        self._noredraw = False
+        self._redraw()
+
+        setattr(task, self.view_attribute, self)
+
     @property
     def state_char(self):
         if self.task.state == TaskState.DONE:
@@ -323,18 +383,27 @@ class TaskView:
         progress_symbols = " ▁▂▃▄▅▆▇█"
         return progress_symbols[int((len(progress_symbols) - 1) * self.task.progress + 0.5)]
 
-    def put_info_str(self, x, y):
+    def info_str(self):
         """
-        draws a length-2 info str at the given position
+        the length-2 info str as list of (offset, text, attr)
         """
+        info = []
         if self.task.timewarrior_is_tracking:
-            self.app.scr.addstr(y, x, "R", curses.color_pair(2))
+            info.append((0, "R", curses.color_pair(2)))
         elif not self.task.state == TaskState.PENDING:
-            self.app.scr.addstr(y, x, self.state_char, self._state_attr)
+            info.append((0, self.state_char, self._state_attr))
         elif not self.task.priority is None:
-            self.app.scr.addstr(y, x, str(self.task.priority), self._state_attr)
+            info.append((0, str(self.task.priority), self._state_attr))
 
-        self.app.scr.addstr(y, x + 1, self.progress_symbol, self._state_attr)
+        info.append((1, self.progress_symbol, self._state_attr))
+        return info
+
+    def put_info_str(self, x, y):
+        """
+        draws a length-2 info str at the given position
+        """
+        for dx, text, attr in self.info_str():
+            self.app.scr.addstr(y, x + dx, text, attr)
 
     def put_info_str_long(self, x, y):
         """
@@ -349,11 +418,11 @@ class TaskView:
         self.app.scr.addstr(y, x + 3, f"{perc:3d}%", self._state_attr)
 
 class ListTask(TaskView):
+    view_attribute = "listview"
+
     def __init__(self, task, geometry, treetasks_app):
         super().__init__(task, geometry, treetasks_app)
 
-        self.cols = TaskWindowColumns(self.width)
-
         self.categories = None
         self.scheduled = None
         self.due = None
@@ -394,50 +463,39 @@ class ListTask(TaskView):
         elif not 's' in Config.get("appearance.columns"):
             self.scheduled = None
 
-    def _replace_columns(self):
-        attr = self._state_attr
-
-        if not self.categories is None:
-            self.categories.place(
-                self.x + self.cols.category.x,
-                self.y,
-                self.app,
-                self.cols.category.w
-            )
-            self.categories.attr = attr
-
-        if not self.due is None:
-            self.due.place(
-                self.x + self.cols.due.x,
-                self.y,
-                self.app,
-                self.cols.due.w
-            )
-            self.due.attr = attr
-
-        if not self.scheduled is None:
-            self.scheduled.place(
-                self.x + self.cols.scheduled.x,
-                self.y,
-                self.app,
-                self.cols.scheduled.w
-            )
-            self.scheduled.attr = attr
-
-    def _redraw(self):
-        if self._noredraw:
-            return
-
-        self.cols.taskwindow_width = self.width
+    # the geometry of the rows of the tree
+    @property
+    def cols(self):
+        return self.app.coordinates.columns
 
-        x = self.x
+    # segments of the columns, see _layout
+    def _column_segments(self):
+        attr = self._state_attr
+        segments = []
+
+        for name, col in (('categories', self.cols.category), ('due', self.cols.due),
+                            ('scheduled', self.cols.scheduled)):
+            editable = getattr(self, name)
+            if not editable is None:
+                # dates are formatted for the width of their column
+                editable.place(self.x + col.x, self.y, self.app, col.w, attr=attr, draw=False)
+                segments.append((name, col.x, editable.line, col.w, attr))
+
+        return segments
+
+    # the row as segments (name, dx, text, maxcols, attr) in the order of
+    # drawing. dx is the offset from the left of the row, name is the
+    # attribute of the editable string showing the text or None
+    def _layout(self):
+        segments = []
+        dx = 0
         if not Config.get("behaviour.flat_tree"):
             for i in range(len(self.task.ancestors) - 1):
-                self.app.scr.addstr(self.y, x + 2, Config.get("appearance.indent_guide").ljust(1))
-                x += Config.get("appearance.indent")
+                segments.append((None, dx + 2, Config.get("appearance.indent_guide").ljust(1), -1, curses.A_NORMAL))
+                dx += Config.get("appearance.indent")
 
                 # 1: width offset, 2: spacing, 6: prefix, 1: spacing to cols
-        title_maxwidth = self.width - self.cols.real_sum - 1 - 6 - x + self.x
+        title_maxwidth = self.width - self.cols.real_sum - 1 - 6 - dx
         attr = self._state_attr
         attr_title = attr
 
@@ -449,45 +507,60 @@ class ListTask(TaskView):
                 pathstr = get_limited_path_overall(self.task, pathstr_maxlength)
 
             pathstr_offset = len(pathstr)
-            self.app.scr.addstr(self.y, x + 5, pathstr)
+            segments.append((None, dx + 6, pathstr, -1, curses.A_NORMAL))
             if attr_title == curses.A_NORMAL:
                 attr_title = curses.A_BOLD
         else:
             pathstr_offset = 0
 
-        self.priority.place(
-                x + 2,
-                self.y, 
-                self.app,
-                1
-            )
-        self.priority.attr = attr
+        segments.append(('priority', dx + 2, self.priority.line, 1, attr))
+        segments.extend((None, dx + 2 + ix, text, -1, a) for ix, text, a in self.info_str())
 
-        self.put_info_str(x + 2, self.y)
-
-        self.app.scr.addstr(self.y, x + 1, "[", attr)
-        self.app.scr.addstr(self.y, x + 4, "] ", attr)
+        segments.append((None, dx + 1, "[", -1, attr))
+        segments.append((None, dx + 4, "] ", -1, attr))
         
         if len(self.task.children) != 0:
             if self.task.collapsed:
-                self.app.scr.addstr(self.y, x, "+")
+                segments.append((None, dx, "+", -1, curses.A_NORMAL))
             else:
-                self.app.scr.addstr(self.y, x, "-")
+                segments.append((None, dx, "-", -1, curses.A_NORMAL))
+
+        if self.app.tm.current.cursor == self.task:
+            attr_title = curses.A_STANDOUT
 
-        self.title.place(
-                x + 6 + pathstr_offset,
-                self.y,
-                self.app,
-                title_maxwidth - pathstr_offset
-            )
+        segments.append(('title', dx + 6 + pathstr_offset, self.title.line,
+                            title_maxwidth - pathstr_offset, attr_title))
 
-        self.title.attr = attr_title
+        return segments + self._column_segments()
 
-        if self.app.tm.current.cursor == self.task:
-            self.title.attr = curses.A_STANDOUT
+    # the layout of a row is kept in the row cache of the application
+    # with the width and the key of the row, see list_row_key. the cache
+    # is dropped with the screen. rows of unchanged tasks are drawn from
+    # their layout without formatting
+    def _redraw(self):
+        if self._noredraw:
+            return
 
         self._readd_columns()
-        self._replace_columns()
+
+        key = (self.width,) + list_row_key(self.task, self.app)
+        try:
+            cached_key, segments = self.app.row_cache[self.task]
+        except KeyError:
+            cached_key = None
+
+        if cached_key != key:
+            segments = self._layout()
+            self.app.row_cache[self.task] = (key, segments)
+
+        for name, dx, text, maxcols, attr in segments:
+            if not name is None:
+                getattr(self, name).place(self.x + dx, self.y, self.app, maxcols, attr=attr, draw=False)
+
+            if maxcols < 0:
+                self.app.scr.addstr(self.y, self.x + dx, text, attr)
+            else:
+                self.app.scr.addnstr(self.y, self.x + dx, text, maxcols, attr)
 
 def strf_timedelta(td):
     s = td.seconds
@@ -501,7 +574,7 @@ def strf_timedelta(td):
 
 def get_limited_path(task, limit):
     dotstr = "…"
-    path = [t.title for t in task.path if not isinstance(t, AnyNode) and not t == task]
+    path = [t.title for t in task.path if not isinstance(t, AnyTaskTreeAwareNode) and not t == task]
     path_limited = [p[:limit - len(dotstr)] + dotstr if len(p) > limit else p for p in path]
     path_str = "/".join(path_limited) + "/" if len(path_limited) else ""
     return path_str
@@ -510,7 +583,7 @@ def get_limited_path(task, limit):
 
 def get_limited_path_overall_old(task, overall_limit):
     dotstr = "…"
-    path = [t.title for t in task.path if not isinstance(t, AnyNode) and not t == task]
+    path = [t.title for t in task.path if not isinstance(t, AnyTaskTreeAwareNode) and not t == task]
     unlimited_length = len("/".join(path))
     if len(path) != 0:
         cut = max(0, ceil((unlimited_length - overall_limit) / len(path)))
@@ -521,11 +594,11 @@ def get_limited_path_overall_old(task, overall_limit):
         return ""
 
 def get_path_parts(task):
-    return [t.title for t in task.path if not isinstance(t, AnyNode) and not t == task]
+    return [t.title for t in task.path if not isinstance(t, AnyTaskTreeAwareNode) and not t == task]
 
 def get_limited_path_overall(task, lim):
     path_parts = get_path_parts(task)
-    get_limited_path_overall_from_parts(path_parts, lim)
+    return get_limited_path_overall_from_parts(path_parts, lim)
 
 def get_limited_path_overall_from_parts(path_parts, lim):
     count = len(path_parts)
@@ -564,6 +637,8 @@ def get_limited_path_overall_from_parts(path_parts, lim):
     return "/".join(path_parts) + "/" if not count == 0 else ""
 
 class DescriptionTask(TaskView):
+    view_attribute = "descriptionview"
+
     def __init__(self, task, geometry, treetasks_app):
         super().__init__(task, geometry, treetasks_app)
 
@@ -597,8 +672,7 @@ class DescriptionTask(TaskView):
         x_right -= len(desc_cat_str)
         self.app.scr.addstr(y, x_right, desc_cat_str, curses.A_DIM)
         x_right -= -1 if cat_len == 0 else cat_len # remove double space '>' signs
-        self.categories.place(x_right, y, self.app)
-        self.categories.attr = curses.color_pair(3)
+        self.categories.place(x_right, y, self.app, attr=curses.color_pair(3))
         x_right -= len(inhr_cat_str)
         self.app.scr.addstr(y, x_right, inhr_cat_str, curses.A_DIM)
 
@@ -624,8 +698,8 @@ class DescriptionTask(TaskView):
             path_str = ""
 
         title_width = max(int(0.5 * self.width), self.width - x_right)
-        self.title.place(x + title_offset + len(path_str), y, self.app, title_width - title_offset)
-        self.title.attr = curses.color_pair(3) | curses.A_BOLD
+        self.title.place(x + title_offset + len(path_str), y, self.app, title_width - title_offset,
+                attr=curses.color_pair(3) | curses.A_BOLD)
 
         # text block
 
@@ -648,6 +722,8 @@ class DescriptionTask(TaskView):
             self.due.place(x_dates, y + 5, self.app)
 
 class ScheduleTask(TaskView):
+    view_attribute = "scheduleview"
+
     def __init__(self, task, geometry, treetasks_app):
         super().__init__(task, geometry, treetasks_app)
 
@@ -684,7 +760,7 @@ class ScheduleTask(TaskView):
         if self.task == self.app.tm.schedule.cursor:
             attr |= curses.A_REVERSE
 
-        sched_coords = ScheduleCoordinates(self.width)
+        sched_coords = self.app.coordinates.schedule_columns
         self.scheduled.place(x + sched_coords.scheduled_offset,
                 y, self.app, sched_coords.datewidth)
         self.due.place(x + sched_coords.due_offset,
@@ -699,9 +775,7 @@ class ScheduleTask(TaskView):
             self.app.scr.addstr(y + 1, x + 1, pathstr)
         else:
             pathstr = ""
-        self.title.place(x + 1 + len(pathstr), y + 1, self.app, self.width - 2)
-
-        self.title.attr = attr
+        self.title.place(x + 1 + len(pathstr), y + 1, self.app, self.width - 2, attr=attr)
 
         self.put_info_str(x + self.width - 6, y + 1)
         #self.app.scr.addstr(y + 1, x + self.width - 6, ' ' + self.state_char + self.progress_symbol + '  ', curses.A_DIM)
@@ -0,0 +1,70 @@
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import logging
+import time
+
+# run times of the phases of handling a key, like dispatching the key,
+# computing the tree list or drawing the panes. the last WINDOW run times
+# of every phase are kept for the percentiles. phases that run inside of
+# other phases are counted in both.
+class PhaseTimings:
+    WINDOW = 200
+
+    def __init__(self):
+        self._durations = {}
+
+    def add(self, phase, duration):
+        try:
+            durations = self._durations[phase]
+        except KeyError:
+            durations = self._durations[phase] = deque(maxlen=self.WINDOW)
+
+        durations.append(duration)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    # decorator timing every call of a function as the phase `name`
+    def timed(self, name):
+        def decorator(func):
+            @wraps(func)
+            def f(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+
+            return f
+
+        return decorator
+
+    # p50, p95 and maximum of the kept run times of every phase in seconds,
+    # as dict from the name of the phase to a tuple
+    def stats(self):
+        stats = {}
+        for name, durations in self._durations.items():
+            d = sorted(durations)
+            stats[name] = (d[int(0.5 * (len(d) - 1))], d[int(0.95 * (len(d) - 1))], d[-1])
+
+        return stats
+
+    # one line with the phases in the order of their p95, the slowest first.
+    # the run times are in milliseconds
+    def summary(self):
+        stats = sorted(self.stats().items(), key=lambda s: s[1][1], reverse=True)
+        return " ".join("{} {:.1f}/{:.1f}/{:.1f}".format(name, p50 * 1000, p95 * 1000, mx * 1000)
+                            for name, (p50, p95, mx) in stats)
+
+    def log(self):
+        logging.info("phase timings (p50/p95/max in ms, last {} runs):".format(self.WINDOW))
+        for name, (p50, p95, mx) in sorted(self.stats().items()):
+            logging.info("{}: {:.2f}/{:.2f}/{:.2f}".format(name, p50 * 1000, p95 * 1000, mx * 1000))
+
+    def clear(self):
+        self._durations = {}
+
+timings = PhaseTimings()
@@ -1,10 +1,15 @@
-from anytree import NodeMixin, RenderTree, AnyNode, PreOrderIter, TreeError
+from anytree import NodeMixin, RenderTree, PreOrderIter, TreeError
 from enum import Enum
 from .config import Config
 from .node import LinkedListNodeMixin, AnyLinkedListNode, AnyTaskTreeAwareNode
 from .referenced import ReferencedDescriptor
 from .cursor import ScheduleCursor, TreeCursor
 from .task import Task
+from .events import TaskChange, TaskEventBus
+from .agenda import AgendaIndex
+from .columns import TaskColumns, NO_DATE, NO_PRIORITY
+from .timing import timings
+from .rows import TaskRows, FlatRows, ScheduleIndex
 import logging
 import os.path
 import datetime
@@ -19,6 +24,142 @@ class TaskTreeSortKey(Enum):
     DATE = 6
 
 
+# sorted views of the children of the tasks of a tree. the children are
+# stored in natural order only, the views are ordered by the composite key
+# (tagged below, primary key) of the current sort order, equal tasks stay in
+# natural order. the keys are computed once per task and kept until the task
+# changes. the view of a task is sorted on first use and dropped when one of
+# its children changes, the views of other orders are kept for switching back.
+# orders are tuples (sort key, reverse, sort tagged below).
+class TaskTreeSorter:
+    # primary keys of the sort keys, tasks without a value go last.
+    # the natural order needs no key
+    PRIMARY_KEYS = {
+        TaskTreeSortKey.TITLE : lambda t: t.title,
+        TaskTreeSortKey.CATEGORY : lambda t: t.categories[0] if len(t.categories) != 0 else '',
+        TaskTreeSortKey.DUE : lambda t: t.due if not t.due is None else datetime.date(2100, 1, 1),
+        TaskTreeSortKey.SCHEDULED : lambda t: t.scheduled if not t.scheduled is None else datetime.date(2100, 1, 1),
+        TaskTreeSortKey.PRIORITY : lambda t: t.priority if not t.priority is None else 10,
+        TaskTreeSortKey.DATE : lambda t: t.sort_date if not t.sort_date is None else datetime.date(2100, 1, 1)
+    }
+
+    # fields any of the keys depends on
+    FIELDS = ('title', 'categories', 'due', 'scheduled', 'priority', 'state')
+
+    # fields the primary keys depend on
+    KEY_FIELDS = {
+        TaskTreeSortKey.TITLE : ('title',),
+        TaskTreeSortKey.CATEGORY : ('categories',),
+        TaskTreeSortKey.DUE : ('due',),
+        TaskTreeSortKey.SCHEDULED : ('scheduled',),
+        TaskTreeSortKey.PRIORITY : ('priority',),
+        TaskTreeSortKey.DATE : ('due', 'scheduled')
+    }
+
+    def __init__(self):
+        # keys of the tasks by order
+        self._keys = {}
+        # sorted children by parent by order
+        self._views = {}
+        self.order = (TaskTreeSortKey.NATURAL, False, False)
+
+    @property
+    def order(self):
+        return self._order
+
+    @order.setter
+    def order(self, order):
+        self._order = order
+        self._order_views = self._views.setdefault(order, {})
+
+    # reversed orders are sorted with reverse=True, which keeps equal tasks
+    # in their order too. the tagged component is inverted then, so tagged
+    # tasks stay below
+    @classmethod
+    def _make_key(cls, task, order):
+        sort_key, reverse, tagged_below = order
+        tagged = tagged_below and (task.done or task.cancelled)
+        primary = cls.PRIMARY_KEYS[sort_key](task)
+
+        if reverse:
+            return (not tagged, primary)
+        else:
+            return (tagged, primary)
+
+    # whether the current order depends on the task field `field`
+    def orders_by(self, field):
+        sort_key, reverse, tagged_below = self._order
+        if tagged_below and field == 'state':
+            return True
+
+        return field in self.KEY_FIELDS.get(sort_key, ())
+
+    def _key_function(self):
+        order = self._order
+        keys = self._keys.setdefault(order, {})
+
+        def key(task):
+            try:
+                return keys[task]
+            except KeyError:
+                k = keys[task] = self._make_key(task, order)
+                return k
+
+        return key
+
+    # the children of `parent` in the current order. the returned
+    # sequence must not be modified
+    def children(self, parent):
+        children = parent._child_list
+        if len(children) < 2:
+            return children
+
+        sort_key, reverse, tagged_below = self._order
+        if sort_key == TaskTreeSortKey.NATURAL:
+            if reverse:
+                children = children[::-1]
+            if not tagged_below:
+                return children
+
+        try:
+            return self._order_views[parent]
+        except KeyError:
+            if sort_key == TaskTreeSortKey.NATURAL:
+                view = sorted(children, key=lambda t: t.done or t.cancelled)
+            else:
+                view = sorted(children, key=self._key_function(), reverse=reverse)
+
+            self._order_views[parent] = view
+            return view
+
+    def _drop_keys(self, tasks):
+        for keys in self._keys.values():
+            for task in tasks:
+                keys.pop(task, None)
+
+    def _drop_views(self, parents):
+        for views in self._views.values():
+            for parent in parents:
+                views.pop(parent, None)
+
+    def on_task_change(self, event):
+        task = event.task
+
+        if event.change == TaskChange.FIELD:
+            if not event.field in self.FIELDS:
+                return
+            self._drop_keys((task,))
+            self._drop_views((task.parent,))
+        elif event.change == TaskChange.ORDER:
+            self._drop_views((task.parent,))
+        else:
+            # the subtree may have been changed while outside of the tree
+            subtree = list(PreOrderIter(task))
+            self._drop_keys(subtree)
+            self._drop_views(subtree)
+            self._drop_views((task.parent if event.parent is None else event.parent,))
+
+
 class TaskTree:
     def __init__(self, path, manager, parser, name=None):
         self.path = path
@@ -31,20 +172,33 @@ class TaskTree:
         self.root = AnyTaskTreeAwareNode(self)
         self.parser = parser()
 
-        self._tree_list_outdated = True
-        self._tree_list_cache = None
+        # the sorter has to drop its views and keys before the rows are updated
+        self._sorter = TaskTreeSorter()
+        self._rows = TaskRows(self)
+        self._flat = FlatRows(self)
+        self._schedule = ScheduleIndex(self)
+        self.events = TaskEventBus()
+        self.events.subscribe(self._sorter.on_task_change)
+        self.events.subscribe(self._rows.on_task_change)
+        self.events.subscribe(self._flat.on_task_change,
+                fields=FlatRows.FIELDS)
+        self.events.subscribe(self._schedule.on_task_change,
+                fields=ScheduleIndex.FIELDS)
+        self._agenda = AgendaIndex(self)
+        self.events.subscribe(self._agenda.on_task_change,
+                fields=AgendaIndex.FIELDS)
 
         self.sort_key = TaskTreeSortKey.NATURAL
         self.sort_reverse = False
 
-        self.schedule = ScheduleCursor(ReferencedDescriptor(TaskTree.schedule_list, self),
-                                 self.sync_cursors)
-        self.view = TreeCursor(ReferencedDescriptor(TaskTree.tree_list, self))
-        
         # if show_only_categories is not empty, hidden_categories is ignored
         self.hidden_categories = set()
         self.show_only_categories = set() 
 
+        self.schedule = ScheduleCursor(ReferencedDescriptor(type(self).schedule_list, self),
+                                 self.sync_cursors)
+        self.view = TreeCursor(ReferencedDescriptor(TaskTree.tree_rows, self))
+
         try:
             open(self.path, mode='r')
         except FileNotFoundError:
@@ -60,6 +214,7 @@ class TaskTree:
     def hidden_categories(self, categories):
         self._hidden_categories = set(categories)
         self.outdate_tree_list()
+        self.outdate_schedule()
 
     @property
     def viewport_height(self):
@@ -96,37 +251,82 @@ class TaskTree:
         self.outdate_tree_list()
 
     def outdate_tree_list(self):
-        self._tree_list_outdated = True
+        self._rows.outdate()
+        self._flat.outdate()
 
-    def _regen_tree_list(self):
-        self.update_order()
+    def outdate_schedule(self):
+        self._schedule.outdate()
+        self._agenda.outdate()
 
-        def filt(task):
-            if not isinstance(task, AnyNode):
-                return task.show
-            else:
-                return False
+    def __contains__(self, task):
+        return self.root.is_ancestor_of(task)
 
-        tasks = list(PreOrderIter(self.root, filt))
-
-        if Config.get("behaviour.flat_tree"):
-            self.update_order(tasks)
+    # changes with every change of a task of the tree, see TaskRows
+    @property
+    def generation(self):
+        return self._rows.generation
+
+    # tasks shown in the tree in pre-order of the sorted views, see
+    # Task.show. the subtrees of hidden or collapsed tasks are skipped
+    # without visiting them.
+    def _visible_tasks(self):
+        show_done = Config.get("behaviour.show_done")
+        show_cancelled = Config.get("behaviour.show_cancelled")
+        children = self._sorter.children
+
+        tasks = []
+        stack = list(reversed(children(self.root)))
+        while len(stack) != 0:
+            task = stack.pop()
+
+            if not show_done and task.done:
+                continue
+            if not show_cancelled and task.cancelled:
+                continue
+            if not task._category_visible:
+                continue
+
+            tasks.append(task)
+            if not task.collapsed:
+                stack.extend(reversed(children(task)))
+
+        return tasks
+
+    # the tasks shown in the flat tree in pre-order of the sorted views,
+    # used to build the FlatRows
+    @timings.timed("tree_list")
+    def _flat_tasks(self):
+        self.update_order()
+        return self._visible_tasks()
 
-        self._tree_list_cache = tasks
-        self._tree_list_outdated = False
-            
+    # the rows of the task pane as a sequence that computes only the rows
+    # that are accessed, see TaskRows. the flat tree is sorted as a whole
+    # if it is not in natural order, see FlatRows
     @property
-    def tree_list(self):
-        if self._tree_list_outdated or self._tree_list_cache is None:
-            self._regen_tree_list()
+    def tree_rows(self):
+        self._sorter.order = self._sort_order()
+        if Config.get("behaviour.flat_tree") and self.sort_key != TaskTreeSortKey.NATURAL:
+            return self._flat
 
-        return self._tree_list_cache
+        return self._rows
 
 
+    # the tasks shown on the schedule, kept sorted by ScheduleIndex
     @property
     def schedule_list(self):
+        return self._schedule
+
+    # the tasks shown on the schedule by date, see AgendaIndex
+    @property
+    def agenda(self):
+        return self._agenda
+
+    # the tasks shown on the schedule sorted by date and priority, equal
+    # tasks in pre-order. used to build the ScheduleIndex
+    @timings.timed("schedule")
+    def _schedule_tasks(self):
         def filt(task):
-            if not isinstance(task, AnyNode):
+            if not isinstance(task, AnyTaskTreeAwareNode):
                 return task.show_on_schedule
             else:
                 return False
@@ -154,67 +354,27 @@ class TaskTree:
     def show_only_categories(self, categories):
         self._show_only_categories = set(categories)
         self.outdate_tree_list()
+        self.outdate_schedule()
 
-    def _sort(self, key, what=None):
-        if what is None:
-            self.root.sort_tree(key=key, reverse=self.sort_reverse)
-
-            if Config.get("behaviour.sort_tagged_below"):
-                self.root.sort_tree(key=lambda t: t.done or t.cancelled)
-        else:
-            what.sort(key=key, reverse=self.sort_reverse)
-            if Config.get("behaviour.sort_tagged_below"):
-                what.sort(key=lambda t: t.done or t.cancelled)
-
-    def _sort_natural(self, what=None):
-        if not what is None:
-            return
+    # the sort order of the tree, see TaskTreeSorter
+    def _sort_order(self):
+        return (self.sort_key, self.sort_reverse, Config.get("behaviour.sort_tagged_below"))
 
-        self.root.sort_tree_link(reverse=self.sort_reverse)
-
-        if Config.get("behaviour.sort_tagged_below"):
-            self.root.sort_tree(key=lambda t: t.done or t.cancelled)
-
-    def update_order(self, what=None):
-        if self.sort_key == TaskTreeSortKey.NATURAL:
-            self._sort_natural(what)
-        elif self.sort_key == TaskTreeSortKey.TITLE:
-            self._sort(lambda t: t.title, what)
-        elif self.sort_key == TaskTreeSortKey.CATEGORY:
-            def k(t):
-                if len(t.categories) == 0:
-                    return ''
-                else:
-                    return t.categories[0]
-            self._sort(k, what)
-        elif self.sort_key == TaskTreeSortKey.DUE:
-            self._sort(lambda t: t.due if not t.due is None else datetime.date(2100,1,1), what)
-        elif self.sort_key == TaskTreeSortKey.SCHEDULED:
-            self._sort(lambda t: t.scheduled if not t.scheduled is None else datetime.date(2100,1,1), what)
-        elif self.sort_key == TaskTreeSortKey.PRIORITY:
-            self._sort(lambda t: t.priority if not t.priority is None else 10, what)
-        elif self.sort_key == TaskTreeSortKey.DATE:
-            def k(t):
-                sort_date = t.sort_date
-                return sort_date if not sort_date is None else datetime.date(2100, 1, 1)
-
-            self._sort(k, what)
+    # the sort order is applied to the views of the sorter,
+    # the children of the tasks stay in natural order
+    @timings.timed("order")
+    def update_order(self):
+        self._sorter.order = self._sort_order()
 
     def set_order(self, key, reverse=False):
         self.sort_key = key
         self.sort_reverse = reverse
     
     def save(self):
-        stb = Config.get("behaviour.sort_tagged_below")
-        Config.set("behaviour.sort_tagged_below", False)
-
-        self._sort_natural()
         self.parser.save(self.path, self)
 
-        Config.set("behaviour.sort_tagged_below", stb)
-
     def sync_cursors(self):
-        if Config.get("behaviour.follow_schedule") and self.schedule.cursor in self.tree_list:
+        if Config.get("behaviour.follow_schedule") and self.schedule.cursor in self.tree_rows:
             self.cursor = self.schedule.cursor
         
     def _new_task_child(self, parent, top=True):
@@ -231,7 +391,6 @@ class TaskTree:
             relevant_child.insert(ntask, before=top)
 
         self.cursor = ntask
-        self.outdate_tree_list()
         return ntask
 
     def new_task_child(self, top=True):
@@ -256,7 +415,6 @@ class TaskTree:
         ntask = Task("", parent=self.cursor.parent)
         self.cursor.insert(ntask, before=before)
         self.cursor = ntask
-        self.outdate_tree_list()
         return ntask
 
     def new_task_sibling_before(self):
@@ -273,14 +431,10 @@ class TaskTree:
 
     def move_selected_task(self, up=True):
         task = self.cursor
-        displayed_children = [t for t in self.tree_list
-                                if t in self.cursor.parent.children]
+        displayed_children = self.view.displayed_children(task.parent)
         cursor_index = displayed_children.index(task)
 
-        amu = Config.get("behaviour.auto_move_up")
-        Config.set("behaviour.auto_move_up", False)
-        self.view.move_hierarchic(delta=(-1 if up else 1))
-        Config.set("behaviour.auto_move_up", amu)
+        self.view.move_hierarchic(delta=(-1 if up else 1), auto_move_up=False)
 
         if task == self.cursor:
             return
@@ -300,7 +454,7 @@ class TaskTree:
         self.move_selected_task(False)
 
     def move_selected_task_treeup(self):
-        if isinstance(self.cursor.parent, AnyNode):
+        if isinstance(self.cursor.parent, AnyTaskTreeAwareNode):
             return
 
         task = self.cursor
@@ -324,7 +478,7 @@ class TaskTree:
         if task is None:
             task = self.cursor
 
-        if not task in PreOrderIter(self.root):
+        if not task in self:
             raise TreeError("Given task not in tree")
 
         if task == self.cursor:
@@ -340,8 +494,6 @@ class TaskTree:
         else:
             del task
 
-        self.outdate_tree_list()
-
     def delete(self, task=None):
         self._delete_or_cut(cut=False, task=task)
 
@@ -366,8 +518,133 @@ class TaskTree:
             self.cursor.insert_as_last_child(task)
         elif not below and not before:
             self.cursor.insert_after(task)
-        
-        self.outdate_tree_list()
 
     def copy_cursor(self):
         self.manager.clipboard = self.cursor
+
+
+# TaskTree backend that runs filtering, sorting and schedule extraction as
+# passes over the TaskColumns of the tree instead of walking the attributes
+# of the task nodes. The columns are kept up to date with the changes of the
+# tasks. The passes build the rows of the flat tree and the schedule, which
+# are then kept up to date as in the TaskTree.
+class ColumnarTaskTree(TaskTree):
+    def __init__(self, path, manager, parser, name=None):
+        self._columns = None
+        super().__init__(path, manager, parser, name)
+        self.events.subscribe(self._on_task_change, fields=TaskColumns.FIELDS)
+
+        # the tasks loaded above were attached before the subscription
+        self._columns = None
+
+    def _on_task_change(self, event):
+        if not self._columns is None:
+            self._columns.on_task_change(event)
+
+    # the columns are built on first use and rebuilt once
+    # half of their rows are empty
+    @property
+    def columns(self):
+        if self._columns is None or self._columns.dead > len(self._columns) // 2:
+            self._columns = TaskColumns(self.root)
+
+        return self._columns
+
+    def _row_key(self):
+        c = self.columns
+
+        if self.sort_key == TaskTreeSortKey.NATURAL:
+            return lambda i: c.link_order[i]
+        elif self.sort_key == TaskTreeSortKey.TITLE:
+            return lambda i: c.tasks[i].title
+        elif self.sort_key == TaskTreeSortKey.CATEGORY:
+            return lambda i: c.categories[i][0] if len(c.categories[i]) != 0 else ''
+        elif self.sort_key == TaskTreeSortKey.DUE:
+            return lambda i: c.due[i] if c.due[i] != 0 else NO_DATE
+        elif self.sort_key == TaskTreeSortKey.SCHEDULED:
+            return lambda i: c.scheduled[i] if c.scheduled[i] != 0 else NO_DATE
+        elif self.sort_key == TaskTreeSortKey.PRIORITY:
+            return lambda i: c.priority[i] if c.priority[i] != NO_PRIORITY else 10
+        elif self.sort_key == TaskTreeSortKey.DATE:
+            return lambda i: c.sort_date(i) if c.sort_date(i) != 0 else NO_DATE
+
+    def _sort_rows(self, rows):
+        if self.sort_key == TaskTreeSortKey.NATURAL:
+            # the flat tree is kept in tree order
+            return
+
+        rows.sort(key=self._row_key(), reverse=self.sort_reverse)
+        if Config.get("behaviour.sort_tagged_below"):
+            rows.sort(key=self.columns.tagged)
+
+    @timings.timed("order")
+    def update_order(self):
+        self._sorter.order = self._sort_order()
+        c = self.columns
+
+        # the sibling order is applied to the columns only
+        c.sort_siblings(self._row_key(), self.sort_reverse, Config.get("behaviour.sort_tagged_below"))
+
+    def _category_visible_rows(self):
+        return self.columns.category_visible(
+                self.hidden_categories,
+                self.show_only_categories,
+                Config.get("behaviour.inherit_categories_showonly"))
+
+    @timings.timed("tree_list")
+    def _flat_tasks(self):
+        self.update_order()
+
+        c = self.columns
+        rows = c.visible_rows(
+                self._category_visible_rows(),
+                Config.get("behaviour.show_done"),
+                Config.get("behaviour.show_cancelled"))
+        self._sort_rows(rows)
+
+        return [c.tasks[i] for i in rows]
+
+    @timings.timed("schedule")
+    def _schedule_tasks(self):
+        if Config.get("behaviour.filter_categories_schedule"):
+            category_visible = self._category_visible_rows()
+        else:
+            category_visible = None
+
+        c = self.columns
+        return [c.tasks[i] for i in c.schedule_rows(category_visible)]
+
+
+# builds task subtrees below `parent` from records (see Task.from_record)
+# with an additional key children, holding the records of the children.
+# the child lists are linked in one step, the attach hooks do not run and
+# no changes are published for the new tasks; the subtrees are attached to
+# `parent` and their attachment is published on commit.
+class TaskTreeBuilder:
+    def __init__(self, parent):
+        self.parent = parent
+        self._tasks = []
+
+    def _build(self, record):
+        task = Task.from_record(record)
+        task._link_children([self._build(c) for c in record.get('children', ())])
+        task._count_descendant_states()
+        task._count_descendant_categories()
+
+        return task
+
+    def add(self, record):
+        task = self._build(record)
+        self._tasks.append(task)
+        return task
+
+    def commit(self):
+        self.parent._link_children(self._tasks)
+        for task in self._tasks:
+            task._update_labels()
+            Task._propagate_progress(self.parent, (0, 0, 0), task._progress_contribution)
+            Task._propagate_categories(self.parent, {}, task._subtree_categories)
+
+            task._publish(TaskChange.ATTACHED)
+
+        self._tasks = []
@@ -1,7 +1,10 @@
-from .tree import TaskTree, TaskTreeSortKey
+from .tree import TaskTree, ColumnarTaskTree, TaskTreeSortKey
 from .cursor import ScheduleCursor, TabbarCursor
 from .referenced import ReferencedDescriptor
+from .rows import MergedSchedule
+from .agenda import merged_range
 from .config import Config
+from .timing import timings
 from .treeparser import TaskTreeParserAuto
 import logging
 import time
@@ -53,6 +56,7 @@ class TreeManager:
     def __init__(self, app):
         self._clipboard = None
         self._app = app
+        self._global_schedule = MergedSchedule(lambda: self.trees)
         self.global_schedule = ScheduleCursor(ReferencedDescriptor(TreeManager.global_schedule_list, self), self.sync_cursors)
         self.tabs = TabbarCursor(ReferencedDescriptor(TreeManager.trees, self))
 
@@ -92,18 +96,27 @@ class TreeManager:
 
     @property
     def global_schedule_list(self):
-        gsl = []
-        for tree in self.trees:
-            gsl += tree.schedule_list
+        return self._global_schedule
+
+    # tasks of all trees with a date of the kind `kind` in [first, last],
+    # see AgendaIndex.range
+    def agenda(self, first=None, last=None, kind='sort_date'):
+        return merged_range([t.agenda for t in self.trees], first, last, kind)
 
-        gsl.sort(key=lambda t: 0 if t.priority is None else t.priority, reverse=True)
-        gsl.sort(key=lambda t: t.sort_date)
+    # number of tasks on the shown schedule with a date of the kind `kind`
+    # in [first, last], see AgendaIndex.count
+    def agenda_count(self, first=None, last=None, kind='sort_date'):
+        if Config.get("behaviour.global_schedule"):
+            trees = self.trees
+        else:
+            trees = [self.current]
 
-        return gsl
+        return sum(t.agenda.count(first, last, kind) for t in trees)
 
     def outdate_tree_lists(self):
         for tree in self.trees:
             tree.outdate_tree_list()
+            tree.outdate_schedule()
 
     @property
     def schedule(self):
@@ -115,7 +128,7 @@ class TreeManager:
     def sync_cursors(self):
         if Config.get("behaviour.global_schedule"):
             for tree in self.trees:
-                if self.global_schedule.cursor in tree.tree_list:
+                if self.global_schedule.cursor in tree.tree_rows:
                     self.current = tree
                     self.current.cursor = self.global_schedule.cursor
                     break
@@ -149,7 +162,12 @@ class TreeManager:
                     lock_pidfile(path)
 
 
-        newtree = TaskTree(path, self, parser=parser, name=name)
+        if Config.get("behaviour.columnar_backend"):
+            tree_class = ColumnarTaskTree
+        else:
+            tree_class = TaskTree
+
+        newtree = tree_class(path, self, parser=parser, name=name)
         self.trees.append(newtree)
         if set_current:
             self.current = newtree
@@ -169,6 +187,7 @@ class TreeManager:
 
         remove_pidfile(tree.path)
 
+    @timings.timed("save")
     def save_all(self):
         for tree in self.trees:
             tree.save()
@@ -3,7 +3,7 @@ import json
 import logging
 from datetime import date
 from .task import Task, TaskState
-from .tree import TaskTree
+from .tree import TaskTree, TaskTreeBuilder
 
 def convert_parser(path_in, path_out, parser_in, parser_out):
     tree = TaskTree(path_in, None, parser_in)
@@ -13,52 +13,51 @@ def convert_parser(path_in, path_out, parser_in, parser_out):
 
 class TaskTreeParserXML:
     @staticmethod
-    def _parse_recursive(elem, parent):
+    def _parse_recursive(elem):
         if not elem.tag == 'todo':
             raise ValueError("No Todo given")
 
-        # find title and create tree node
+        # find title and create the record of the task
         title_element = elem.find('title')
         if title_element is None:
             raise ValueError("Given Todo has no title")
 
-        title = title_element.text
-        node = Task(title, parent)
+        record = {'title' : title_element.text, 'categories' : [], 'children' : []}
 
         # parse attributes
         if 'collapse' in elem.attrib:
-            node.collapsed = True if elem.attrib['collapse'] == "yes" else False
+            record['collapsed'] = True if elem.attrib['collapse'] == "yes" else False
 
         if 'done' in elem.attrib and elem.attrib['done'] == "yes":
-            node.state = TaskState.DONE
+            record['state'] = TaskState.DONE
 
         if 'cancelled' in elem.attrib and elem.attrib['cancelled'] == "yes":
-            node.state = TaskState.CANCELLED
+            record['state'] = TaskState.CANCELLED
 
         # parse children
         for child in elem:
             if child.tag == "text":
                 if child.text is None:
-                    node.text = ""
+                    record['text'] = ""
                 else:
-                    node.text = child.text
+                    record['text'] = child.text
 
             elif child.tag == "category":
-                node.add_category(child.text)
+                record['categories'].append(child.text)
 
             elif child.tag == "todo":
-                TaskTreeParserXML._parse_recursive(child, node)
+                record['children'].append(TaskTreeParserXML._parse_recursive(child))
 
             elif child.tag == "deadline":
-                node.due = date(int(child.find("year").text), int(child.find("month").text), int(child.find("day").text))
+                record['due'] = date(int(child.find("year").text), int(child.find("month").text), int(child.find("day").text))
 
             elif child.tag == "scheduled":
-                node.scheduled = date(int(child.find("year").text), int(child.find("month").text), int(child.find("day").text))
+                record['scheduled'] = date(int(child.find("year").text), int(child.find("month").text), int(child.find("day").text))
 
             elif child.tag == "priority":
-                node.priority = int(child.text)
+                record['priority'] = int(child.text)
 
-        return node
+        return record
 
     @staticmethod
     def _encode_recursive(task, this_element):
@@ -128,12 +127,15 @@ class TaskTreeParserXML:
     def load(path, tasktree):
         tree = ET.parse(path)
         root = tree.getroot()
+        builder = TaskTreeBuilder(tasktree.root)
 
         for child in root:
             if child.tag == "filter":
                 TaskTreeParserXML._get_hidden_categories(child, tasktree)
             else:
-                TaskTreeParserXML._parse_recursive(child, tasktree.root)
+                builder.add(TaskTreeParserXML._parse_recursive(child))
+
+        builder.commit()
 
     @staticmethod
     def save(path, tasktree):
@@ -182,36 +184,31 @@ class TaskTreeParserJSON:
         return tdict
 
     @staticmethod
-    def _task_from_dict(tdict, parent_task):
-        task = Task(tdict['title'], parent=parent_task)
-        task.text = tdict['text']
-        task.priority = tdict['priority']
-        task.collapsed = tdict['collapsed']
-
-        for cat in tdict['categories']:
-            task.add_category(cat)
+    def _record_from_dict(tdict):
+        record = {
+            'title' : tdict['title'],
+            'text' : tdict['text'],
+            'priority' : tdict['priority'],
+            'collapsed' : tdict['collapsed'],
+            'categories' : tdict['categories']
+        }
 
-        if tdict['due'] is None:
-            task.due = None
-        else:
-            task.due = date.fromisoformat(tdict['due'])
+        if not tdict['due'] is None:
+            record['due'] = date.fromisoformat(tdict['due'])
 
-        if tdict['scheduled'] is None:
-            task.scheduled = None
-        else:
-            task.scheduled = date.fromisoformat(tdict['scheduled'])
+        if not tdict['scheduled'] is None:
+            record['scheduled'] = date.fromisoformat(tdict['scheduled'])
 
         if tdict['state'] == 'pending':
-            task.state = TaskState.PENDING
+            record['state'] = TaskState.PENDING
         elif tdict['state'] == 'done':
-            task.state = TaskState.DONE
+            record['state'] = TaskState.DONE
         elif tdict['state'] == 'cancelled':
-            task.state = TaskState.CANCELLED
+            record['state'] = TaskState.CANCELLED
 
-        for c in tdict['children']:
-            TaskTreeParserJSON._task_from_dict(c, task)
+        record['children'] = [TaskTreeParserJSON._record_from_dict(c) for c in tdict['children']]
 
-        return task
+        return record
 
     @staticmethod 
     def load(path, tasktree):
@@ -224,8 +221,11 @@ class TaskTreeParserJSON:
         if 'hidden_categories' in jsondata['filter']:
             tasktree.hidden_categories = jsondata['filter']['hidden_categories']
 
+        builder = TaskTreeBuilder(tasktree.root)
         for c in jsondata['tasks']:
-            TaskTreeParserJSON._task_from_dict(c, tasktree.root)
+            builder.add(TaskTreeParserJSON._record_from_dict(c))
+
+        builder.commit()
 
     @staticmethod
     def save(path, tasktree):